@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:00
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+def parse_price(price):
+    # Same rules as restaurant.models.parse_price: numbers and numeric strings
+    if isinstance(price, bool) or not isinstance(price, (int, float, str)):
+        return None
+    try:
+        value = Decimal(str(price).strip())
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def backfill_price_summary(apps, schema_editor):
+    # Historical models have no custom save(), so compute the columns here
+    MenuItem = apps.get_model('restaurant', 'MenuItem')
+    items = list(MenuItem.objects.all())
+    for item in items:
+        sizes_and_prices = item.sizes_and_prices or []
+        prices = [
+            price for price in (
+                parse_price(entry.get('price')) for entry in sizes_and_prices if isinstance(entry, dict)
+            )
+            if price is not None
+        ]
+        item.min_price = min(prices) if prices else None
+        item.max_price = max(prices) if prices else None
+        item.variant_count = len(sizes_and_prices)
+    MenuItem.objects.bulk_update(items, ['min_price', 'max_price', 'variant_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0004_alter_menuitem_category_alter_menuitem_sub_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='max_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='min_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=7, null=True),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='variant_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_price_summary, migrations.RunPython.noop),
+    ]
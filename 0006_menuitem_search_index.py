@@ -0,0 +1,142 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:30
+
+from django.db import migrations
+
+# Full-text search index over menu items (SQLite FTS5).
+# Triggers keep it in sync with restaurant_menuitem, so bulk updates and raw
+# SQL are indexed too. Category and sub-category keys are indexed by their
+# display labels, frozen here as they were when this migration was written.
+
+CATEGORY_LABELS = [
+    ('chinese_veg_starter', 'Chinese Veg Starter'),
+    ('chinese_nonveg_starter', 'Chinese Non-Veg Starter'),
+    ('veg_indian_snacks', 'Veg Indian Snacks'),
+    ('nonveg_indian_snacks', 'Non-Veg Indian Snacks'),
+    ('soups', 'Soups'),
+    ('snacks', 'Snacks'),
+    ('mocktail', 'Mocktail'),
+    ('chinese_veg_tandoori', 'Chinese Veg Tandoori Starter'),
+    ('chinese_nonveg_tandoori', 'Chinese Non-Veg Tandoori Starter'),
+    ('bombil_seafood', 'Bombil Sea Food'),
+    ('quick_bites', 'Quick Bites'),
+    ('chinese_veg_rice', 'Chinese Veg Rice'),
+    ('chinese_veg_noodles', 'Chinese Veg Noodles'),
+    ('chinese_nonveg_rice', 'Chinese Non-Veg Rice'),
+    ('chinese_nonveg_noodles', 'Chinese Non-Veg Noodles'),
+    ('veg_indian_main', 'Veg - Indian Main Course'),
+    ('vegetable', 'Vegetable'),
+    ('dum', 'Dum'),
+    ('paneer', 'Paneer'),
+    ('fish_tandoori', 'Fish Tandoori'),
+    ('ginger', 'Ginger'),
+    ('breads', 'Breads'),
+]
+SUB_CATEGORY_LABELS = [
+    ('momos', 'Momos'),
+    ('chilly', 'Chilly'),
+    ('manchurian', 'Manchurian'),
+    ('dry', 'Dry'),
+    ('gravy', 'Gravy'),
+    ('rolls', 'Rolls'),
+    ('chinese_soup', 'Chinese Soup'),
+    ('hot_sour_soup', 'Hot and Sour Soup'),
+    ('clear_soup', 'Clear Soup'),
+    ('steam', 'Steam'),
+    ('fry', 'Fry'),
+    ('paneer_tikka', 'Paneer Tikka'),
+    ('chicken_tikka', 'Chicken Tikka'),
+    ('tandoori', 'Tandoori'),
+    ('fried_rice', 'Fried Rice'),
+    ('schezwan_rice', 'Schezwan Rice'),
+    ('triple_schezwan', 'Triple Schezwan'),
+    ('manchurian_rice', 'Manchurian Rice'),
+    ('burnt_garlic', 'Burnt Garlic'),
+    ('hakka_noodles', 'Hakka Noodles'),
+    ('schezwan_noodles', 'Schezwan Noodles'),
+    ('triple_schezwan_noodles', 'Triple Schezwan Noodles'),
+    ('manchurian_noodles', 'Manchurian Noodles'),
+    ('cheese_noodles', 'Cheese Noodles'),
+    ('dal', 'Dal'),
+    ('masala', 'Masala'),
+    ('curry', 'Curry'),
+    ('paneer_dishes', 'Paneer Dishes'),
+    ('egg', 'Egg'),
+    ('chicken', 'Chicken'),
+    ('mutton', 'Mutton'),
+    ('prawns', 'Prawns'),
+]
+
+
+def _label_case(column, labels):
+    # SQL CASE mapping a choice key to its label; unknown keys fall back to
+    # the key itself with underscores read as spaces
+    whens = ' '.join(
+        "WHEN '{}' THEN '{}'".format(key, label.replace("'", "''"))
+        for key, label in labels
+    )
+    return "CASE {col} {whens} ELSE replace(coalesce({col}, ''), '_', ' ') END".format(
+        col=column, whens=whens
+    )
+
+
+def _insert_sql(prefix):
+    return (
+        "INSERT INTO restaurant_menuitem_fts(rowid, name, description, category, sub_category) "
+        "VALUES ({p}.id, {p}.name, {p}.description, {category}, {sub_category});".format(
+            p=prefix,
+            category=_label_case(prefix + '.category', CATEGORY_LABELS),
+            sub_category=_label_case(prefix + '.sub_category', SUB_CATEGORY_LABELS),
+        )
+    )
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        # Other databases use the ORM fallback in menu_search
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE restaurant_menuitem_fts USING fts5("
+        "name, description, category, sub_category, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER restaurant_menuitem_fts_ai AFTER INSERT ON restaurant_menuitem BEGIN "
+        + _insert_sql('new') + " END"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER restaurant_menuitem_fts_ad AFTER DELETE ON restaurant_menuitem BEGIN "
+        "DELETE FROM restaurant_menuitem_fts WHERE rowid = old.id; END"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER restaurant_menuitem_fts_au "
+        "AFTER UPDATE OF name, description, category, sub_category ON restaurant_menuitem BEGIN "
+        "DELETE FROM restaurant_menuitem_fts WHERE rowid = old.id; "
+        + _insert_sql('new') + " END"
+    )
+    # Backfill existing rows
+    schema_editor.execute(
+        "INSERT INTO restaurant_menuitem_fts(rowid, name, description, category, sub_category) "
+        "SELECT m.id, m.name, m.description, {category}, {sub_category} FROM restaurant_menuitem m".format(
+            category=_label_case('m.category', CATEGORY_LABELS),
+            sub_category=_label_case('m.sub_category', SUB_CATEGORY_LABELS),
+        )
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('restaurant_menuitem_fts_ai', 'restaurant_menuitem_fts_ad', 'restaurant_menuitem_fts_au'):
+        schema_editor.execute("DROP TRIGGER IF EXISTS " + trigger)
+    schema_editor.execute("DROP TABLE IF EXISTS restaurant_menuitem_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0005_menuitem_price_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0006_menuitem_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(condition=models.Q(('available', True)), fields=['category'], name='menuitem_available_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menuitem',
+            index=models.Index(fields=['category', 'sub_category', 'name'], name='menuitem_cat_subcat_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['date', 'time', 'guests'], name='reservation_slot_guests_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('confirmed', False)), fields=['date', 'time'], name='reservation_unconfirmed_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:58
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_slot_ledger(apps, schema_editor):
+    Reservation = apps.get_model('restaurant', 'Reservation')
+    ReservationSlot = apps.get_model('restaurant', 'ReservationSlot')
+    ReservationSlot.objects.bulk_create([
+        ReservationSlot(date=row['date'], time=row['time'], booked_guests=row['total'])
+        for row in Reservation.objects.values('date', 'time').annotate(total=Sum('guests'))
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0007_menuitem_reservation_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservationSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('booked_guests', models.PositiveIntegerField(default=0)),
+                ('capacity', models.PositiveIntegerField(default=45)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'time'), name='unique_reservation_slot')],
+            },
+        ),
+        migrations.RunPython(backfill_slot_ledger, migrations.RunPython.noop),
+    ]
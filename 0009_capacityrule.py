@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0008_reservationslot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapacityRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='e.g. Lunch, Dinner', max_length=60)),
+                ('date', models.DateField(blank=True, help_text='Only on this date, e.g. a holiday', null=True)),
+                ('weekday', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], help_text='Every week on this day. Leave date and weekday empty for every day', null=True)),
+                ('start_time', models.TimeField(help_text='First seating')),
+                ('end_time', models.TimeField(help_text='Last seating')),
+                ('capacity', models.PositiveIntegerField(default=45, help_text='Seats in use at any moment')),
+                ('seating_minutes', models.PositiveSmallIntegerField(default=90, help_text='How long a table stays occupied')),
+            ],
+            options={
+                'ordering': ['date', 'weekday', 'start_time'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='reservationslot',
+            name='capacity',
+        ),
+    ]
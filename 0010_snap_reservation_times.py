@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:31
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Sum
+
+
+def snap_reservation_times(apps, schema_editor):
+    """
+    Move existing reservations onto the slot grid and rebuild the slot
+    ledger from them, so each slot has one ledger row.
+    """
+    Reservation = apps.get_model('restaurant', 'Reservation')
+    ReservationSlot = apps.get_model('restaurant', 'ReservationSlot')
+    step = getattr(settings, 'RESERVATION_SLOT_MINUTES', 15)
+
+    moved = []
+    for reservation in Reservation.objects.only('id', 'time').iterator():
+        minutes = reservation.time.hour * 60 + reservation.time.minute + reservation.time.second / 60
+        snapped = int(minutes / step + 0.5) * step
+        if snapped >= 24 * 60:
+            snapped -= step
+        snapped_time = datetime.time(snapped // 60, snapped % 60)
+        if snapped_time != reservation.time:
+            reservation.time = snapped_time
+            moved.append(reservation)
+    Reservation.objects.bulk_update(moved, ['time'], batch_size=500)
+
+    ReservationSlot.objects.all().delete()
+    ReservationSlot.objects.bulk_create([
+        ReservationSlot(date=row['date'], time=row['time'], booked_guests=row['total'])
+        for row in Reservation.objects.values('date', 'time').annotate(total=Sum('guests'))
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0009_capacityrule'),
+    ]
+
+    operations = [
+        migrations.RunPython(snap_reservation_times, migrations.RunPython.noop),
+    ]
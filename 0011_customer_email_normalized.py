@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+def backfill_email_normalized(apps, schema_editor):
+    """
+    Fill email_normalized, merging customers whose emails differ only in
+    casing or spaces into the oldest of them.
+    """
+    Customer = apps.get_model('restaurant', 'Customer')
+    Reservation = apps.get_model('restaurant', 'Reservation')
+
+    kept = {}
+    for customer in Customer.objects.order_by('id'):
+        key = (customer.email or '').strip().lower()
+        if key in kept:
+            Reservation.objects.filter(customer=customer).update(customer=kept[key])
+            customer.delete()
+            continue
+        customer.email_normalized = key
+        customer.save(update_fields=['email_normalized'])
+        kept[key] = customer
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0010_snap_reservation_times'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='email_normalized',
+            field=models.EmailField(editable=False, max_length=254, null=True),
+        ),
+        migrations.RunPython(backfill_email_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='email_normalized',
+            field=models.EmailField(editable=False, max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0011_customer_email_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Table',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='e.g. T1, Patio 3', max_length=30, unique=True)),
+                ('seats', models.PositiveSmallIntegerField()),
+                ('combine_group', models.CharField(blank=True, help_text='Tables in the same group can be combined. Leave empty if this table stands alone', max_length=30)),
+                ('active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['seats', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='tables',
+            field=models.ManyToManyField(blank=True, related_name='reservations', to='restaurant.table'),
+        ),
+    ]
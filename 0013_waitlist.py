@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0012_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Waitlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('guests', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('promoted', 'Promoted'), ('cancelled', 'Cancelled')], default='waiting', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('promoted_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('notified_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='restaurant.customer')),
+                ('reservation', models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waitlist_entry', to='restaurant.reservation')),
+            ],
+            options={
+                'ordering': ['date', 'time', 'created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'waiting')), fields=['date', 'time', 'created_at'], name='waitlist_waiting_idx'), models.Index(condition=models.Q(('notified_at__isnull', True), ('status', 'promoted')), fields=['promoted_at'], name='waitlist_unnotified_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:10
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def queue_unsent_promotions(apps, schema_editor):
+    """
+    Move promotion emails still waiting on Waitlist.notified_at into the outbox.
+    """
+    Waitlist = apps.get_model('restaurant', 'Waitlist')
+    NotificationOutbox = apps.get_model('restaurant', 'NotificationOutbox')
+    NotificationOutbox.objects.bulk_create(
+        [
+            NotificationOutbox(
+                idempotency_key=f'waitlist_promotion:{reservation_id}',
+                kind='waitlist_promotion',
+                reservation_id=reservation_id,
+            )
+            for reservation_id in Waitlist.objects.filter(
+                status='promoted', notified_at__isnull=True, reservation__isnull=False
+            ).values_list('reservation_id', flat=True)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0013_waitlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=100, unique=True)),
+                ('kind', models.CharField(choices=[('staff_reservation', 'New reservation (staff)'), ('customer_reservation', 'Reservation received (customer)'), ('waitlist_promotion', 'Waitlist promotion (customer)')], max_length=30)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('dead', 'Failed for good')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='reservation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='restaurant.reservation'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='outbox_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationoutbox',
+            index=models.Index(condition=models.Q(('status', 'sending')), fields=['claimed_at'], name='outbox_sending_idx'),
+        ),
+        migrations.RunPython(queue_unsent_promotions, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='waitlist',
+            name='waitlist_unnotified_idx',
+        ),
+        migrations.RemoveField(
+            model_name='waitlist',
+            name='notified_at',
+        ),
+    ]
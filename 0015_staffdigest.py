@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0014_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254, unique=True)),
+                ('last_reservation_id', models.PositiveBigIntegerField(default=0)),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -1,8 +1,40 @@
 from django.contrib import admin
-from .models import MenuItem, Customer, Reservation
+from django.utils import timezone
+from .models import MenuItem, Customer, Reservation, ReservationSlot, CapacityRule, Table, Waitlist, NotificationOutbox, StaffDigest, format_price
+from .forms import ReservationAdminForm
+from .menu_cache import bump_menu_version
+from .waitlist import promote_waitlist
 
 # Register your models here.
 
+class PriceRangeFilter(admin.SimpleListFilter):
+    """
+    Filter menu items by their lowest price, using the indexed min_price column.
+    """
+    title = 'price'
+    parameter_name = 'price'
+
+    # (lookup value, label, lower bound, upper bound)
+    PRICE_RANGES = (
+        ('under_150', 'Under ₹150', None, 150),
+        ('150_250', '₹150 - ₹250', 150, 250),
+        ('250_350', '₹250 - ₹350', 250, 350),
+        ('350_plus', '₹350 and above', 350, None),
+    )
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, label, _, _ in self.PRICE_RANGES]
+
+    def queryset(self, request, queryset):
+        for value, _, lower, upper in self.PRICE_RANGES:
+            if self.value() == value:
+                if lower is not None:
+                    queryset = queryset.filter(min_price__gte=lower)
+                if upper is not None:
+                    queryset = queryset.filter(min_price__lt=upper)
+        return queryset
+
+
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
     """
@@ -12,7 +44,7 @@ class MenuItemAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'sub_category', 'display_price', 'available')
     
     # Add filters for easy navigation
-    list_filter = ('category', 'sub_category', 'available')
+    list_filter = ('category', 'sub_category', 'available', PriceRangeFilter)
     
     # Enable search functionality
     search_fields = ('name', 'description')
@@ -29,41 +61,41 @@ class MenuItemAdmin(admin.ModelAdmin):
             'fields': ('category', 'sub_category')
         }),
         ('Pricing', {
-            'fields': ('sizes_and_prices',),
+            'fields': ('sizes_and_prices', 'min_price', 'max_price', 'variant_count'),
             'description': 'Add prices in JSON format: [{"size": "Full", "price": 200}, {"size": "Half", "price": 120}]'
         }),
     )
     
+    # Derived from sizes_and_prices on save
+    readonly_fields = ('min_price', 'max_price', 'variant_count')
+    
     # Set default ordering
     ordering = ('category', 'sub_category', 'name')
     
-    # Custom method to calculate and display the price range from the JSONField
+    # Display the price range from the denormalized price columns
     def display_price(self, obj):
-        if obj.sizes_and_prices:
-            try:
-                prices = [item.get('price', 0) for item in obj.sizes_and_prices if isinstance(item.get('price'), (int, float))]
-                if prices:
-                    min_price = min(prices)
-                    max_price = max(prices)
-                    if min_price == max_price:
-                        return f"₹{min_price}"
-                    return f"₹{min_price} - ₹{max_price}"
-            except (ValueError, TypeError):
-                return "—"
-        return "N/A"
+        if obj.min_price is None:
+            return "N/A"
+        if obj.min_price == obj.max_price:
+            return f"₹{format_price(obj.min_price)}"
+        return f"₹{format_price(obj.min_price)} - ₹{format_price(obj.max_price)}"
     
     display_price.short_description = 'Price Range'
+    display_price.admin_order_field = 'min_price'
     
     # Add custom admin actions
     actions = ['mark_available', 'mark_unavailable']
     
     def mark_available(self, request, queryset):
         updated = queryset.update(available=True)
+        # queryset.update() skips the save signals, so invalidate the menu here
+        bump_menu_version()
         self.message_user(request, f'{updated} items marked as available.')
     mark_available.short_description = 'Mark selected items as available'
     
     def mark_unavailable(self, request, queryset):
         updated = queryset.update(available=False)
+        bump_menu_version()
         self.message_user(request, f'{updated} items marked as unavailable.')
     mark_unavailable.short_description = 'Mark selected items as unavailable'
 
@@ -81,7 +113,106 @@ class ReservationAdmin(admin.ModelAdmin):
     """
     Admin configuration for Reservations
     """
-    list_display = ('id', 'customer', 'date', 'time', 'guests', 'confirmed', 'created_at')
+    list_display = ('id', 'customer', 'date', 'time', 'guests', 'table_names', 'confirmed', 'created_at')
     list_filter = ('date', 'time', 'confirmed')
     search_fields = ('customer__name', 'customer__email')
-    list_editable = ('confirmed',) # Allows you to confirm reservations from the list view
\ No newline at end of file
+    list_editable = ('confirmed',) # Allows you to confirm reservations from the list view
+    # Snaps edited times to the slot grid
+    form = ReservationAdminForm
+    filter_horizontal = ('tables',)
+    # Tables are set on booking; after moving bookings, re-seat the day with allocate_tables
+
+    def get_queryset(self, request):
+        # One query for the customers and one for all tables on the page
+        return super().get_queryset(request).select_related('customer').prefetch_related('tables')
+
+    def table_names(self, obj):
+        return ' + '.join(table.name for table in obj.tables.all()) or '-'
+    table_names.short_description = 'Tables'
+    # Edits, confirmations and deletes here refresh the availability cache
+    # through the Reservation signals (see signals.py)
+
+
+@admin.register(ReservationSlot)
+class ReservationSlotAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the per-slot capacity ledger
+    """
+    list_display = ('date', 'time', 'booked_guests')
+    list_filter = ('date',)
+    # booked_guests is maintained from Reservation; fix drift with reconcile_reservation_slots
+    readonly_fields = ('booked_guests',)
+    ordering = ('-date', 'time')
+
+
+@admin.register(CapacityRule)
+class CapacityRuleAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for seats and seating length per service
+    """
+    list_display = ('name', 'date', 'weekday', 'start_time', 'end_time', 'capacity', 'seating_minutes')
+    list_filter = ('weekday',)
+    list_editable = ('capacity', 'seating_minutes')
+
+
+@admin.register(Table)
+class TableAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the dining room's tables
+    """
+    list_display = ('name', 'seats', 'combine_group', 'active')
+    list_filter = ('combine_group', 'active')
+    list_editable = ('seats', 'combine_group', 'active')
+    search_fields = ('name',)
+
+
+@admin.register(Waitlist)
+class WaitlistAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for parties waiting for a full slot
+    """
+    list_display = ('id', 'customer', 'date', 'time', 'guests', 'status', 'created_at', 'reservation')
+    list_filter = ('status', 'date')
+    search_fields = ('customer__name', 'customer__email')
+    list_select_related = ('customer', 'reservation__customer')
+    readonly_fields = ('promoted_at', 'reservation')
+    ordering = ('date', 'time', 'created_at')
+    actions = ['promote_now']
+
+    def promote_now(self, request, queryset):
+        promoted = 0
+        for date in queryset.filter(status=Waitlist.WAITING).values_list('date', flat=True).distinct():
+            promoted += promote_waitlist(date)['promoted']
+        self.message_user(request, f'{promoted} waiting parties promoted to reservations.')
+    promote_now.short_description = 'Promote waiting parties where seats are free'
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for queued notification emails
+    """
+    list_display = ('id', 'kind', 'reservation', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'last_error')
+    list_filter = ('status', 'kind')
+    search_fields = ('idempotency_key',)
+    list_select_related = ('reservation__customer',)
+    readonly_fields = ('idempotency_key', 'kind', 'reservation', 'attempts', 'claimed_at', 'sent_at', 'last_error', 'created_at')
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        # Failed-for-good emails get a fresh set of attempts
+        updated = queryset.exclude(status=NotificationOutbox.SENT).update(
+            status=NotificationOutbox.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} emails queued to be sent on the next drain.')
+    retry_now.short_description = 'Send again on the next drain'
+
+
+@admin.register(StaffDigest)
+class StaffDigestAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for staff digest progress
+    """
+    list_display = ('recipient', 'last_reservation_id', 'last_sent_at')
+    # Lower last_reservation_id to send reservations again in the next digest
+    readonly_fields = ('last_sent_at',)
@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from restaurant.capacity import reallocate_tables
+
+
+class Command(BaseCommand):
+    help = 'Seat every reservation on a day at tables again, e.g. after tables or bookings changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Day to re-seat as YYYY-MM-DD (default: today)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the outcome without writing to the database',
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                date = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        else:
+            date = timezone.localdate()
+
+        result = reallocate_tables(date, dry_run=options['dry_run'])
+        summary = f"Seated: {result['seated']}, Unseated: {len(result['unseated'])}"
+        for reservation in result['unseated']:
+            self.stdout.write(f'  No table for #{reservation.pk}: {reservation.guests} guests at {reservation.time:%H:%M}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing written. {summary}'))
+        elif result['unseated']:
+            self.stdout.write(self.style.WARNING(f'Tables allocated for {date}. {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Tables allocated for {date}. {summary}'))
@@ -2,3 +2,7 @@ from django.apps import AppConfig
 class RestaurantConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'restaurant'
+
+    def ready(self):
+        # Connect the cache invalidation signal handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,138 @@
+"""
+Availability cache for reservation slots.
+Keeps the seats booked per start time of a day in Django's cache, under a
+per-day version number, together with the capacity rules. Reservation
+changes bump the version of the days they touch once committed and write the
+fresh figures through, so every worker process sharing the cache sees the
+change on its next read.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_versions import bump_version, get_versions
+from .models import CapacityRule, ReservationSlot
+
+# Cache key template holding the current availability version of one day
+AVAILABILITY_VERSION_KEY = 'availability:version:{date}'
+
+# Cache key template for {time: booked seats} of one day and version
+AVAILABILITY_DAY_KEY = 'availability:day:{date}:{version}'
+
+# Cache key holding every CapacityRule
+CAPACITY_RULES_KEY = 'availability:rules'
+
+# Shared hit/miss counters, for monitoring (see availability_cache_stats)
+AVAILABILITY_HITS_KEY = 'availability:stats:hits'
+AVAILABILITY_MISSES_KEY = 'availability:stats:misses'
+
+
+def get_cache_timeout():
+    # Upper bound on staleness if the cache is not shared between processes
+    return getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 300)
+
+
+def _count(key, amount):
+    if not amount:
+        return
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Evicted between add() and incr(); losing one sample is fine
+        pass
+
+
+def _get_versions(dates):
+    version_keys = {date: AVAILABILITY_VERSION_KEY.format(date=date.isoformat()) for date in dates}
+    stored = get_versions(list(version_keys.values()))
+    return {date: stored[key] for date, key in version_keys.items()}
+
+
+def _day_key(date, version):
+    return AVAILABILITY_DAY_KEY.format(date=date.isoformat(), version=version)
+
+
+def _load_days(dates):
+    """
+    Read {date: {time: booked seats}} for the given dates from the slot
+    ledger in one query. Start times without bookings are left out.
+    """
+    days = {date: {} for date in dates}
+    rows = ReservationSlot.objects.filter(date__in=dates, booked_guests__gt=0).values_list(
+        'date', 'time', 'booked_guests'
+    )
+    for date, slot_time, booked_guests in rows:
+        days[date][slot_time] = booked_guests
+    return days
+
+
+def get_booked_seats(dates):
+    """
+    Return {date: {time: booked seats}} for the given dates. Cached days
+    cost no query; the rest are read together in one.
+    """
+    dates = list(dict.fromkeys(dates))
+    versions = _get_versions(dates)
+    day_keys = {date: _day_key(date, versions[date]) for date in dates}
+    cached = cache.get_many(day_keys.values())
+
+    days = {date: cached[key] for date, key in day_keys.items() if key in cached}
+    missing = [date for date in dates if date not in days]
+    _count(AVAILABILITY_HITS_KEY, len(days))
+    _count(AVAILABILITY_MISSES_KEY, len(missing))
+
+    if missing:
+        loaded = _load_days(missing)
+        cache.set_many({day_keys[date]: loaded[date] for date in missing}, timeout=get_cache_timeout())
+        days.update(loaded)
+    return days
+
+
+def get_capacity_rules():
+    """
+    Return every CapacityRule, from the cache when possible.
+    """
+    rules = cache.get(CAPACITY_RULES_KEY)
+    if rules is None:
+        rules = list(CapacityRule.objects.all())
+        cache.set(CAPACITY_RULES_KEY, rules, timeout=get_cache_timeout())
+    return rules
+
+
+def invalidate_capacity_rules():
+    cache.delete(CAPACITY_RULES_KEY)
+
+
+def bump_availability(date):
+    """
+    Invalidate the cached availability of one day and write the current
+    figures through under the new version. Call it after the change is
+    committed, so the figures written are never older than the change.
+    """
+    # Instances built in code may still hold the date as a string
+    date = ReservationSlot._meta.get_field('date').to_python(date)
+    version = bump_version(AVAILABILITY_VERSION_KEY.format(date=date.isoformat()))
+    if version is None:
+        # No version stored yet, so nothing is cached for this day
+        return
+    cache.set(_day_key(date, version), _load_days([date])[date], timeout=get_cache_timeout())
+
+
+def get_availability_cache_stats():
+    """
+    Return the shared hit/miss counters and the hit ratio.
+    """
+    counters = cache.get_many([AVAILABILITY_HITS_KEY, AVAILABILITY_MISSES_KEY])
+    hits = counters.get(AVAILABILITY_HITS_KEY, 0)
+    misses = counters.get(AVAILABILITY_MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else None,
+    }
+
+
+def reset_availability_cache_stats():
+    cache.delete_many([AVAILABILITY_HITS_KEY, AVAILABILITY_MISSES_KEY])
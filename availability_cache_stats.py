@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from restaurant.availability_cache import get_availability_cache_stats, reset_availability_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show the availability cache hit/miss counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_availability_cache_stats()
+        hit_ratio = f"{stats['hit_ratio']:.1%}" if stats['hit_ratio'] is not None else 'n/a'
+        self.stdout.write(self.style.SUCCESS(
+            f"Hits: {stats['hits']}, Misses: {stats['misses']}, Hit ratio: {hit_ratio}"
+        ))
+        if options['reset']:
+            reset_availability_cache_stats()
+            self.stdout.write(self.style.WARNING('Counters reset'))
@@ -0,0 +1,94 @@
+import os
+import sys
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_project.settings')
+django.setup()
+
+import time
+from datetime import date, time as datetime_time, timedelta
+
+from django.template import Context, Engine, engines
+
+from restaurant.models import Customer, Reservation
+from restaurant.notifications import reservation_reminder_email, shared_blocks
+
+# Drafts reminder emails in bulk (text + HTML, not sent) and reports the
+# cost per message: through the cached templates and shared blocks, and
+# with every template loaded, compiled and rendered from scratch, as a
+# baseline. Runs in memory only; the database is never touched.
+
+MESSAGE_COUNTS = (1000, 5000)
+# A drafted reminder must cost less than this many microseconds
+MAX_MESSAGE_US = 1000.0
+
+reservations = []
+for index in range(max(MESSAGE_COUNTS)):
+    customer = Customer(name=f'Guest {index}', email=f'guest{index}@example.com', phone=f'+91-98{index:08d}')
+    reservations.append(Reservation(
+        pk=index + 1, customer=customer, guests=index % 8 + 1,
+        date=date(2025, 11, 25) + timedelta(days=index % 14),
+        time=datetime_time(11 + index % 11, 15 * (index % 4)),
+    ))
+
+# Same templates, without the cached loader
+django_engine = engines['django'].engine
+uncached = Engine(dirs=django_engine.dirs, loaders=['django.template.loaders.filesystem.Loader'])
+
+
+def draft_cached(count):
+    for reservation in reservations[:count]:
+        reservation_reminder_email(reservation, reservation.customer)
+
+
+def draft_uncached(count):
+    for reservation in reservations[:count]:
+        blocks = {
+            name: uncached.get_template(template).render(Context())
+            for name, template in (('footer_text', 'email_footer.txt'), ('footer_html', 'email_footer.html'),
+                                   ('contact_text', 'email_contact.txt'), ('contact_html', 'email_contact.html'))
+        }
+        context = Context({**blocks, 'reservation': reservation, 'customer': reservation.customer})
+        uncached.get_template('email_reservation_reminder.txt').render(context)
+        uncached.get_template('email_reservation_reminder.html').render(context)
+
+
+def serialize(count):
+    # Full MIME message, as the SMTP backend builds it before sending
+    for reservation in reservations[:count]:
+        reservation_reminder_email(reservation, reservation.customer).message().as_bytes()
+
+
+def timed(func, count):
+    started = time.perf_counter()
+    func(count)
+    return (time.perf_counter() - started) * 1_000_000 / count
+
+
+print("=" * 60)
+print("EMAIL RENDERING BENCHMARK")
+print("=" * 60)
+print("\nReminder emails, text body + HTML alternative, drafted but not sent")
+
+# Warm up: compile the templates and render the shared blocks once
+shared_blocks()
+draft_cached(10)
+
+failed = False
+print(f"\n{'Messages':>8}  {'Cached':>10}  {'Uncached':>10}  {'Speedup':>7}  {'With MIME':>10}")
+for count in MESSAGE_COUNTS:
+    cached_us = timed(draft_cached, count)
+    uncached_us = timed(draft_uncached, count)
+    mime_us = timed(serialize, count)
+    print(f"{count:>8}  {cached_us:>8.1f}us  {uncached_us:>8.1f}us  {uncached_us / cached_us:>6.1f}x  {mime_us:>8.1f}us")
+    if cached_us > MAX_MESSAGE_US:
+        print(f"  ✗ Slower than {MAX_MESSAGE_US:.0f} us per message")
+        failed = True
+
+print("\n" + "=" * 60)
+if failed:
+    print("✗ BENCHMARK FAILED")
+    print("=" * 60)
+    sys.exit(1)
+print("✓ Reminder emails drafted within the limit")
+print("=" * 60)
@@ -0,0 +1,106 @@
+import os
+import sys
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_project.settings')
+django.setup()
+
+import random
+import time
+
+from restaurant.capacity import get_default_rule
+from restaurant.table_allocation import TablePlan, allocate
+
+# Times the table allocator on synthetic days of hundreds of reservations.
+# Runs in memory only; the database is never touched.
+
+DAY_SIZES = (100, 300, 600)
+ROUNDS = 5
+# A full day must be allocated within this many milliseconds
+MAX_DAY_MS = 50.0
+
+random.seed(42)
+seating_minutes = get_default_rule().seating_minutes
+
+# 40 tables: 2, 4 and 6 tops in combinable groups, plus a few fixed tables
+tables = []
+for group, sizes in (('window', [2] * 6), ('main', [4] * 10), ('terrace', [4] * 6 + [6] * 4), ('patio', [2] * 6)):
+    for seats in sizes:
+        tables.append((len(tables) + 1, seats, group))
+for seats in (2, 2, 4, 4, 6, 8, 8, 10):
+    tables.append((len(tables) + 1, seats, ''))
+
+# Service from 11:00 to 22:30 on a 15 minute grid, busiest in the evening
+start_times = list(range(11 * 60, 22 * 60 + 31, 15))
+weights = [3 if 18 * 60 <= minutes <= 21 * 60 else 1 for minutes in start_times]
+
+
+def make_day(count):
+    bookings = []
+    for key in range(count):
+        begin = random.choices(start_times, weights)[0]
+        guests = random.choices((1, 2, 3, 4, 5, 6, 8, 10, 12), (2, 10, 4, 8, 3, 3, 2, 1, 1))[0]
+        bookings.append((key, begin, begin + seating_minutes, guests))
+    return bookings
+
+
+def best_of(rounds, func):
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def book_one_by_one(bookings):
+    # What admit_reservation does per booking: find a table, then book it
+    plan = TablePlan(tables)
+    seated = 0
+    for _, begin, end, guests in bookings:
+        table_ids = plan.find(guests, begin, end)
+        if table_ids is not None:
+            plan.book(table_ids, begin, end)
+            seated += 1
+    return seated
+
+
+print("=" * 60)
+print("TABLE ALLOCATION BENCHMARK")
+print("=" * 60)
+print(f"\n{len(tables)} tables, {sum(seats for _, seats, _ in tables)} seats, "
+      f"{len(TablePlan(tables).options)} table options, {seating_minutes} minute seatings")
+print(f"Best of {ROUNDS} rounds, limit {MAX_DAY_MS:.0f} ms per day\n")
+
+failed = False
+print(f"{'Bookings':>8}  {'Whole day':>10}  {'One by one':>10}  {'Per booking':>11}  {'Seated':>7}")
+for count in DAY_SIZES:
+    bookings = make_day(count)
+    day_ms, (assignments, unseated) = best_of(ROUNDS, lambda: allocate(bookings, tables))
+    single_ms, _ = best_of(ROUNDS, lambda: book_one_by_one(bookings))
+    seated = len(assignments) / count * 100
+    print(f"{count:>8}  {day_ms:>8.2f}ms  {single_ms:>8.2f}ms  {single_ms / count * 1000:>9.1f}us  {seated:>6.1f}%")
+
+    # No table may be double booked
+    windows = {}
+    for key, begin, end, _ in bookings:
+        for table_id in assignments.get(key, ()):
+            windows.setdefault(table_id, []).append((begin, end))
+    for table_windows in windows.values():
+        table_windows.sort()
+        if any(prev_end > begin for (_, prev_end), (begin, _) in zip(table_windows, table_windows[1:])):
+            print("  ✗ A table was double booked")
+            failed = True
+            break
+    if day_ms > MAX_DAY_MS:
+        print(f"  ✗ Slower than {MAX_DAY_MS:.0f} ms")
+        failed = True
+
+print("\n" + "=" * 60)
+if failed:
+    print("✗ BENCHMARK FAILED")
+    print("=" * 60)
+    sys.exit(1)
+print("✓ Every day allocated within the limit, no table double booked")
+print("=" * 60)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from restaurant.menu_artifacts import build_menu_artifacts, get_artifact_root, brotli
+
+
+class Command(BaseCommand):
+    help = 'Render the menu JSON and menu page into content-hashed static files with gzip/brotli variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild even if the menu content is unchanged (e.g. after editing menu.html)',
+        )
+
+    def handle(self, *args, **options):
+        manifest = build_menu_artifacts(force=options['force'])
+
+        if manifest['skipped']:
+            self.stdout.write(f"Menu unchanged ({manifest['content_hash']}), nothing to build.")
+            return
+
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('brotli is not installed; only .gz variants were written.'))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {manifest['json']} and {manifest['html']} in {get_artifact_root()}"
+            )
+        )
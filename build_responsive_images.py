@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from restaurant.image_pipeline import build_responsive_images, get_output_root
+
+
+class Command(BaseCommand):
+    help = 'Build resized AVIF/WebP derivatives of site images for the responsive_image template tag'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Download remote source images again instead of using the cached copies',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild derivatives even if the source image is unchanged',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise CommandError('Pillow is required: pip install Pillow')
+
+        manifest = build_responsive_images(
+            refresh=options['refresh'],
+            force=options['force'],
+            log=self.stdout.write,
+        )
+        variant_count = sum(len(entry['variants']) for entry in manifest.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{len(manifest)} images, {variant_count} derivatives in {get_output_root()}'
+            )
+        )
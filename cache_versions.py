@@ -0,0 +1,50 @@
+"""
+Version counters for cached data.
+Cached data is stored under keys that include a version number held in
+Django's cache; bumping the number with cache.incr() moves every process
+sharing the cache to fresh keys at once.
+"""
+
+import time
+
+from django.core.cache import cache
+
+
+def initial_version():
+    # Seed from the clock so a version key lost from the cache never
+    # comes back with a number that older data was stored under
+    return time.time_ns() // 1000
+
+
+def get_version(key):
+    """
+    Return the version stored under `key`, creating it if the cache has none.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_versions(keys):
+    """
+    Return {key: version} for several version keys, creating missing ones.
+    """
+    stored = cache.get_many(keys)
+    for key in keys:
+        if key not in stored:
+            cache.add(key, initial_version(), timeout=None)
+            stored[key] = cache.get(key)
+    return stored
+
+
+def bump_version(key):
+    """
+    Move `key` to a new version and return it, or None if no version is
+    stored yet (so nothing was cached under it).
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return None
@@ -0,0 +1,538 @@
+"""
+Seat capacity bookkeeping for reservations.
+Each ReservationSlot row holds the guests booked to start at one (date, time).
+A party occupies its seats for the seating length of its service, so
+availability for a start time is the peak number of seats in use over that
+window, found with one sweep over the day's start times.
+"""
+
+import datetime
+import math
+from bisect import bisect_right
+from contextlib import ExitStack, contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import CapacityRule, Reservation, ReservationSlot, Table
+from .availability_cache import bump_availability, get_booked_seats, get_capacity_rules
+from .table_allocation import TablePlan, allocate
+
+
+class SlotFull(Exception):
+    """
+    Raised when a reservation does not fit in the seats left in its slot.
+    """
+    def __init__(self, remaining_capacity):
+        self.remaining_capacity = remaining_capacity
+        super().__init__(f'Only {remaining_capacity} seats remaining')
+
+
+class NoTableAvailable(SlotFull):
+    """
+    Raised when there are seats left but no free table, or tables pushed
+    together, can seat the party.
+    """
+
+
+def get_default_rule():
+    """
+    The service used when no CapacityRule applies to a day, from settings.
+    """
+    opens, last_seating = getattr(settings, 'RESERVATION_OPENING_HOURS', ('11:00', '22:30'))
+    return CapacityRule(
+        name='Default',
+        start_time=datetime.time.fromisoformat(opens),
+        end_time=datetime.time.fromisoformat(last_seating),
+        capacity=getattr(settings, 'RESERVATION_DEFAULT_CAPACITY', 45),
+        seating_minutes=getattr(settings, 'RESERVATION_SEATING_MINUTES', 90),
+    )
+
+
+def rules_for_date(rules, date):
+    """
+    The services on one day: its date rules if it has any, else its
+    weekday rules, else the every-day rules, else the default rule.
+    """
+    applicable = [rule for rule in rules if rule.applies_to(date)]
+    for tier in ('date', 'weekday'):
+        specific = [rule for rule in applicable if getattr(rule, tier) is not None]
+        if specific:
+            return sorted(specific, key=lambda rule: rule.start_time)
+    return sorted(applicable, key=lambda rule: rule.start_time) or [get_default_rule()]
+
+
+def service_for(services, time):
+    """
+    The service a start time belongs to, or None outside service hours.
+    """
+    for service in services:
+        if service.covers(time):
+            return service
+    return None
+
+
+def _minutes(time):
+    return time.hour * 60 + time.minute + time.second / 60
+
+
+def occupancy_profile(booked, services):
+    """
+    Turn a day's {start time: booked seats} into seats in use over the day.
+
+    Returns:
+        tuple: (minutes, seats) lists; seats[i] are in use from minutes[i]
+               until minutes[i + 1]
+    """
+    default_minutes = get_default_rule().seating_minutes
+    changes = {}
+    for start, guests in booked.items():
+        service = service_for(services, start)
+        begin = _minutes(start)
+        end = begin + (service.seating_minutes if service else default_minutes)
+        changes[begin] = changes.get(begin, 0) + guests
+        changes[end] = changes.get(end, 0) - guests
+
+    minutes, seats, in_use = [], [], 0
+    for minute in sorted(changes):
+        in_use += changes[minute]
+        minutes.append(minute)
+        seats.append(in_use)
+    return minutes, seats
+
+
+def peak_occupancy(profile, begin, end):
+    """
+    Most seats in use at any moment in [begin, end), in minutes.
+    """
+    minutes, seats = profile
+    index = bisect_right(minutes, begin) - 1
+    peak = seats[index] if index >= 0 else 0
+    index += 1
+    while index < len(minutes) and minutes[index] < end:
+        peak = max(peak, seats[index])
+        index += 1
+    return peak
+
+
+def remaining_for_times(booked, services, times):
+    """
+    Seats free for a new party at each start time, from one sweep over the
+    day's bookings. Times outside service hours have no seats.
+    """
+    profile = occupancy_profile(booked, services)
+    remaining = {}
+    for time in times:
+        service = service_for(services, time)
+        if service is None:
+            remaining[time] = 0
+            continue
+        begin = _minutes(time)
+        peak = peak_occupancy(profile, begin, begin + service.seating_minutes)
+        remaining[time] = max(service.capacity - peak, 0)
+    return remaining
+
+
+def get_slot_minutes():
+    return getattr(settings, 'RESERVATION_SLOT_MINUTES', 15)
+
+
+def snap_to_slot(time):
+    """
+    Round a time to the nearest start time on the slot grid, which runs
+    every RESERVATION_SLOT_MINUTES from midnight (19:07 -> 19:00 for 15).
+    """
+    step = get_slot_minutes()
+    snapped = int(_minutes(time) / step + 0.5) * step
+    if snapped >= 24 * 60:
+        # Never round past midnight into the next day
+        snapped -= step
+    return datetime.time(snapped // 60, snapped % 60)
+
+
+def seating_window(services, time):
+    """
+    (begin, end) in minutes from midnight that a party starting at `time` occupies.
+    """
+    service = service_for(services, time)
+    begin = _minutes(time)
+    return begin, begin + (service.seating_minutes if service else get_default_rule().seating_minutes)
+
+
+def load_table_plan(date, services):
+    """
+    A TablePlan with every table booking already made on `date`, or None
+    when no tables are set up (seats are then only counted, not placed).
+    """
+    tables = list(Table.objects.filter(active=True).values_list('id', 'seats', 'combine_group'))
+    if not tables:
+        return None
+    plan = TablePlan(tables)
+    booked_tables = Reservation.tables.through.objects.filter(reservation__date=date).values_list(
+        'table_id', 'reservation__time'
+    )
+    for table_id, start in booked_tables:
+        plan.book((table_id,), *seating_window(services, start))
+    return plan
+
+
+def _parse_slot(date, time):
+    # Views and scripts may pass the raw query string values
+    date = ReservationSlot._meta.get_field('date').to_python(date)
+    time = snap_to_slot(ReservationSlot._meta.get_field('time').to_python(time))
+    return date, time
+
+
+def get_slot_capacity(date, time):
+    """
+    Seats of the service a start time belongs to, or None outside service hours.
+
+    Raises:
+        ValidationError: If date or time is a string that does not parse
+    """
+    date, time = _parse_slot(date, time)
+    service = service_for(rules_for_date(get_capacity_rules(), date), time)
+    return service.capacity if service else None
+
+
+def get_remaining_capacity(date, time):
+    """
+    Seats free for a new party starting at this time, from the
+    availability cache.
+
+    Raises:
+        ValidationError: If date or time is a string that does not parse
+    """
+    date, time = _parse_slot(date, time)
+    services = rules_for_date(get_capacity_rules(), date)
+    return remaining_for_times(get_booked_seats([date])[date], services, [time])[time]
+
+
+def get_bookable_times(services):
+    """
+    Slot grid times from each service's first to its last seating.
+    """
+    step = get_slot_minutes()
+    times = set()
+    for service in services:
+        first = math.ceil(_minutes(service.start_time) / step) * step
+        for minute in range(first, int(_minutes(service.end_time)) + 1, step):
+            times.add(datetime.time(minute // 60, minute % 60))
+    return sorted(times)
+
+
+def get_availability_grid(start_date, days=1):
+    """
+    Remaining seats for every bookable start time over `days` days from
+    `start_date`. Days not in the availability cache are read from the slot
+    ledger in one query.
+
+    Booked start times that are not on the grid (e.g. bookings made before
+    RESERVATION_SLOT_MINUTES changed) are included too, if they fall in
+    service hours.
+
+    Returns:
+        tuple: ({date: {time: remaining seats}}, largest service capacity)
+    """
+    dates = [start_date + datetime.timedelta(days=offset) for offset in range(days)]
+    rules = get_capacity_rules()
+    grid = {}
+    max_capacity = 0
+    for date, booked in get_booked_seats(dates).items():
+        services = rules_for_date(rules, date)
+        max_capacity = max([max_capacity, *(service.capacity for service in services)])
+        booked_times = [time for time in booked if service_for(services, time)]
+        times = sorted(set(get_bookable_times(services)) | set(booked_times))
+        grid[date] = remaining_for_times(booked, services, times)
+    return grid, max_capacity
+
+
+def suggest_slots(date, time, guests, count=None, days_around=None):
+    """
+    Nearest start times that can seat `guests`, on the same day and up to
+    `days_around` days either side, closest first. Every day in the window
+    is read in one bulk fetch and scanned in memory.
+
+    Returns:
+        list: Up to `count` dicts like {'date': date, 'time': time, 'remaining': 12}
+    """
+    date, time = _parse_slot(date, time)
+    if count is None:
+        count = getattr(settings, 'RESERVATION_SUGGESTIONS', 3)
+    if days_around is None:
+        days_around = getattr(settings, 'RESERVATION_SUGGESTION_DAYS', 1)
+
+    # Nothing in the past can be suggested
+    now = timezone.localtime().replace(tzinfo=None)
+    dates = [
+        date + datetime.timedelta(days=offset)
+        for offset in range(-days_around, days_around + 1)
+        if date + datetime.timedelta(days=offset) >= now.date()
+    ]
+    if not dates:
+        return []
+
+    requested = datetime.datetime.combine(date, time)
+    rules = get_capacity_rules()
+    candidates = []
+    for day, booked in get_booked_seats(dates).items():
+        services = rules_for_date(rules, day)
+        for start, remaining in remaining_for_times(booked, services, get_bookable_times(services)).items():
+            when = datetime.datetime.combine(day, start)
+            if remaining < guests or when == requested or when <= now:
+                continue
+            candidates.append((abs(when - requested), when, remaining))
+
+    # Closest first; of two equally close times, the earlier one
+    candidates.sort(key=lambda candidate: candidate[:2])
+    return [
+        {'date': when.date(), 'time': when.time(), 'remaining': remaining}
+        for _, when, remaining in candidates[:count]
+    ]
+
+
+def adjust_booked_guests(date, time, delta):
+    """
+    Atomically add `delta` guests (negative to release seats) to a slot.
+    """
+    if not delta:
+        return
+    updated = ReservationSlot.objects.filter(date=date, time=time).update(
+        booked_guests=Greatest(F('booked_guests') + delta, 0)
+    )
+    if not updated and delta > 0:
+        # First booking in this slot; another request may create the row at the same time
+        ReservationSlot.objects.bulk_create(
+            [ReservationSlot(date=date, time=time, booked_guests=0)], ignore_conflicts=True
+        )
+        ReservationSlot.objects.filter(date=date, time=time).update(
+            booked_guests=F('booked_guests') + delta
+        )
+
+
+def _time_at(minutes):
+    minutes = int(minutes)
+    return datetime.time(minutes // 60, minutes % 60)
+
+
+def _overlaps(services, start, begin, end):
+    other_begin, other_end = seating_window(services, start)
+    return other_begin < end and other_end > begin
+
+
+def lock_overlapping_slots(date, services, time):
+    """
+    Lock the ledger rows of every start time whose seating overlaps that of
+    a party starting at `time`, and return what they hold.
+
+    The rows of the bookable start times in that range are created first
+    (INSERT ... ON CONFLICT DO NOTHING), so two bookings whose seatings
+    overlap always lock each other's start row and are checked one after
+    another, while bookings that cannot overlap (lunch and late dinner) go
+    ahead side by side. Rows are inserted and locked in time order, so
+    concurrent bookings cannot deadlock.
+
+    Returns:
+        dict: {time: booked_guests} for the overlapping start times
+    """
+    begin, end = seating_window(services, time)
+    starts = {time} | {start for start in get_bookable_times(services) if _overlaps(services, start, begin, end)}
+    ReservationSlot.objects.bulk_create(
+        [ReservationSlot(date=date, time=start, booked_guests=0) for start in sorted(starts)],
+        ignore_conflicts=True,
+    )
+
+    # Starts earlier than one longest seating before `begin` cannot overlap
+    longest = max(service.seating_minutes for service in [*services, get_default_rule()])
+    rows = ReservationSlot.objects.select_for_update().filter(date=date, time__gte=_time_at(max(begin - longest, 0)))
+    if end < 24 * 60:
+        rows = rows.filter(time__lt=_time_at(end))
+    return {
+        start: booked_guests
+        for start, booked_guests in rows.order_by('time').values_list('time', 'booked_guests')
+        if _overlaps(services, start, begin, end)
+    }
+
+
+@contextmanager
+def booking_transaction(savepoint=True):
+    """
+    transaction.atomic() for booking seats.
+
+    On SQLite the outermost transaction starts with BEGIN IMMEDIATE, which
+    takes the database write lock up front: concurrent bookings wait for it
+    (up to the connection timeout) instead of failing with "database is
+    locked" when a transaction that has read the ledger tries to write.
+    SQLite has a single writer, so while a booking holds the lock every
+    other write waits too; keep the transaction short. Other databases lock
+    only the ledger rows (see lock_overlapping_slots).
+    """
+    connection = transaction.get_connection()
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(savepoint=savepoint):
+            yield
+        return
+
+    # transaction_mode is read from settings on every connect, so connect first
+    connection.ensure_connection()
+    with ExitStack() as stack:
+        default_mode, connection.transaction_mode = connection.transaction_mode, 'IMMEDIATE'
+        try:
+            stack.enter_context(transaction.atomic())
+        finally:
+            connection.transaction_mode = default_mode
+        yield
+
+
+def admit_reservation(reservation):
+    """
+    Check that a new reservation fits and save it, as one atomic step.
+
+    The ledger rows of the start times whose seating overlaps this one are
+    locked before the sweep (see lock_overlapping_slots), so concurrent
+    bookings that compete for the same seats are checked one after another
+    and other bookings are not held up. On SQLite, booking_transaction()
+    serializes the bookings on the database write lock instead.
+
+    When tables are set up, the party is also placed at a free table or
+    combination of tables, recorded in reservation.tables.
+
+    Raises:
+        SlotFull: If the party does not fit; nothing is saved
+        NoTableAvailable: If seats are left but no table can seat the party
+    """
+    reservation.date, reservation.time = _parse_slot(reservation.date, reservation.time)
+    # No savepoint when the caller already opened a transaction (e.g. to
+    # save the customer too): SlotFull then rolls back the whole booking
+    with booking_transaction(savepoint=False):
+        services = rules_for_date(CapacityRule.objects.all(), reservation.date)
+        service = service_for(services, reservation.time)
+        if service is None:
+            raise SlotFull(0)
+
+        booked = lock_overlapping_slots(reservation.date, services, reservation.time)
+        remaining = remaining_for_times(booked, services, [reservation.time])[reservation.time]
+        if reservation.guests > remaining:
+            raise SlotFull(remaining)
+
+        # Place the party at a table, or tables pushed together
+        table_ids = ()
+        plan = load_table_plan(reservation.date, services)
+        if plan is not None:
+            table_ids = plan.find(reservation.guests, *seating_window(services, reservation.time))
+            if table_ids is None:
+                raise NoTableAvailable(remaining)
+
+        ReservationSlot.objects.filter(date=reservation.date, time=reservation.time).update(
+            booked_guests=F('booked_guests') + reservation.guests
+        )
+        # The seats are already counted; stop the post_save handler adding them again
+        reservation._seats_claimed = True
+        reservation.save()
+        Reservation.tables.through.objects.bulk_create([
+            Reservation.tables.through(reservation_id=reservation.pk, table_id=table_id)
+            for table_id in table_ids
+        ])
+    return reservation
+
+
+def reallocate_tables(date, dry_run=False):
+    """
+    Seat every reservation on `date` again from scratch, e.g. after tables
+    were added or bookings were moved in the admin.
+
+    Returns:
+        dict: {'seated': count, 'unseated': [reservations that fit no table]}
+    """
+    services = rules_for_date(CapacityRule.objects.all(), date)
+    tables = list(Table.objects.filter(active=True).values_list('id', 'seats', 'combine_group'))
+    reservations = {reservation.pk: reservation for reservation in Reservation.objects.filter(date=date)}
+    bookings = [
+        (reservation.pk, *seating_window(services, reservation.time), reservation.guests)
+        for reservation in reservations.values()
+    ]
+    assignments, unseated = allocate(bookings, tables)
+
+    if not dry_run:
+        Through = Reservation.tables.through
+        with transaction.atomic():
+            Through.objects.filter(reservation__date=date).delete()
+            Through.objects.bulk_create([
+                Through(reservation_id=reservation_id, table_id=table_id)
+                for reservation_id, table_ids in assignments.items()
+                for table_id in table_ids
+            ], batch_size=500)
+
+    return {
+        'seated': len(assignments),
+        'unseated': [reservations[reservation_id] for reservation_id in unseated],
+    }
+
+
+def snap_reservation_times(dry_run=False):
+    """
+    Move every reservation that is off the slot grid to its nearest grid
+    time, then rebuild the slot ledger to match.
+
+    Returns:
+        int: Number of reservations moved
+    """
+    moved = []
+    for reservation in Reservation.objects.only('id', 'date', 'time').iterator():
+        snapped = snap_to_slot(reservation.time)
+        if snapped != reservation.time:
+            reservation.time = snapped
+            moved.append(reservation)
+
+    if not dry_run and moved:
+        with transaction.atomic():
+            # bulk_update sends no signals; reconcile_slots() moves the seats
+            Reservation.objects.bulk_update(moved, ['time'], batch_size=500)
+            reconcile_slots()
+            # Drop the emptied off-grid rows so the ledger keeps to the grid
+            ReservationSlot.objects.filter(booked_guests=0).delete()
+    return len(moved)
+
+
+def reconcile_slots(dry_run=False):
+    """
+    Rebuild booked_guests for every slot from the Reservation table.
+
+    Returns:
+        dict: Counts of created, corrected and unchanged ledger rows
+    """
+    totals = {
+        (row['date'], row['time']): row['total']
+        for row in Reservation.objects.values('date', 'time').annotate(total=Sum('guests'))
+    }
+    slots = {(slot.date, slot.time): slot for slot in ReservationSlot.objects.all()}
+
+    to_create = [
+        ReservationSlot(date=date, time=time, booked_guests=total)
+        for (date, time), total in totals.items()
+        if (date, time) not in slots
+    ]
+    to_update = []
+    for key, slot in slots.items():
+        total = totals.get(key, 0)
+        if slot.booked_guests != total:
+            slot.booked_guests = total
+            to_update.append(slot)
+
+    if not dry_run:
+        with transaction.atomic():
+            ReservationSlot.objects.bulk_create(to_create, batch_size=500)
+            ReservationSlot.objects.bulk_update(to_update, ['booked_guests'], batch_size=500)
+            # Bulk writes send no signals; refresh the cached days they touched
+            for changed_date in {slot.date for slot in to_create + to_update}:
+                transaction.on_commit(partial(bump_availability, changed_date))
+
+    return {
+        'created': len(to_create),
+        'corrected': len(to_update),
+        'unchanged': len(slots) - len(to_update),
+    }
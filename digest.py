@@ -0,0 +1,114 @@
+"""
+Staff digest.
+With STAFF_DIGEST_MINUTES set, staff get one email every that many
+minutes listing the new unconfirmed reservations, instead of one email per
+booking. Progress is a watermark per recipient (StaffDigest): the highest
+reservation id already sent. Each digest reads the next
+STAFF_DIGEST_MAX_RESERVATIONS reservations above it in one primary key
+range query, so its size and the time to build it do not grow with the
+backlog; a larger backlog goes out as several digests.
+"""
+
+import datetime
+import logging
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import NotificationOutbox, Reservation, StaffDigest
+from .notifications import send_batch, staff_digest_email
+
+logger = logging.getLogger(__name__)
+
+
+def get_digest_minutes():
+    return getattr(settings, 'STAFF_DIGEST_MINUTES', 0)
+
+
+def digest_enabled():
+    return get_digest_minutes() > 0
+
+
+def get_digest_recipients():
+    return getattr(settings, 'STAFF_DIGEST_RECIPIENTS', None) or [settings.MANAGER_EMAIL]
+
+
+def _start_watermark():
+    # Start after the last reservation staff were emailed about one by one
+    return NotificationOutbox.objects.filter(
+        kind=NotificationOutbox.STAFF_RESERVATION
+    ).aggregate(last=Max('reservation_id'))['last'] or 0
+
+
+def send_due_digests(force=False):
+    """
+    Send the digest to every recipient whose last one is at least
+    STAFF_DIGEST_MINUTES old (or to all of them with `force`).
+
+    Returns:
+        int: Number of digest emails sent
+    """
+    if not digest_enabled():
+        return 0
+    now = timezone.now()
+    due_before = now - datetime.timedelta(minutes=get_digest_minutes())
+
+    sent = 0
+    for recipient in get_digest_recipients():
+        digest, _ = StaffDigest.objects.get_or_create(
+            recipient=recipient, defaults={'last_reservation_id': _start_watermark()}
+        )
+        if force or digest.last_sent_at is None or digest.last_sent_at <= due_before:
+            sent += send_digest(digest, now)
+    return sent
+
+
+def send_digest(digest, now):
+    """
+    Send one recipient the reservations above their watermark, in digests of
+    at most STAFF_DIGEST_MAX_RESERVATIONS, and move the watermark past
+    each digest once it is sent.
+
+    Returns:
+        int: Number of digest emails sent
+    """
+    # Take this recipient's turn; another process that read the same row
+    # updates nothing and backs off
+    claimed = StaffDigest.objects.filter(
+        pk=digest.pk, last_sent_at=digest.last_sent_at, last_reservation_id=digest.last_reservation_id
+    ).update(last_sent_at=now)
+    if not claimed:
+        return 0
+
+    batch_size = getattr(settings, 'STAFF_DIGEST_MAX_RESERVATIONS', 50)
+    today = timezone.localdate()
+    watermark = digest.last_reservation_id
+    sent = 0
+    while True:
+        started = timezone.now()
+        batch = list(
+            Reservation.objects.filter(pk__gt=watermark, confirmed=False)
+            .select_related('customer')
+            .order_by('pk')[:batch_size]
+        )
+        if not batch:
+            break
+        # Bookings for days that have passed are not worth a call any more
+        reservations = [reservation for reservation in batch if reservation.date >= today]
+        if reservations:
+            error, = send_batch([staff_digest_email(reservations, digest.recipient)])
+            if error is not None:
+                logger.error(f"Failed to send staff digest to {digest.recipient}: {str(error)}")
+                if not sent:
+                    # Try again on the next run rather than after a full interval
+                    StaffDigest.objects.filter(pk=digest.pk).update(last_sent_at=digest.last_sent_at)
+                break
+            sent += 1
+            elapsed = (timezone.now() - started).total_seconds() * 1000
+            logger.info(f"Staff digest of {len(reservations)} reservations sent to {digest.recipient} in {elapsed:.1f} ms")
+        watermark = batch[-1].pk
+        StaffDigest.objects.filter(pk=digest.pk).update(last_reservation_id=watermark)
+        if len(batch) < batch_size:
+            break
+    return sent
@@ -0,0 +1,111 @@
+"""
+In-process notification dispatcher.
+For deployments without a drain_notifications worker: emails are sent by a
+small thread pool in the web process, after the response path has handed
+them over. The pool is bounded - NOTIFICATION_DISPATCH_THREADS threads and
+at most NOTIFICATION_DISPATCH_QUEUE waiting tasks - and submit() never
+blocks: when the queue is full it returns False and the work stays in the
+caller's fallback store (the notification outbox). Sends are bounded by
+EMAIL_TIMEOUT, the SMTP socket timeout.
+
+When the worker process is recycled, queued tasks are dropped (their
+outbox rows stay pending) and only the sends already running are waited for.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """
+    A fixed pool of worker threads with a bounded task queue, started on
+    first use. The workers are daemon threads, so the interpreter does not
+    wait for queued tasks on exit; the atexit hook below drops them and
+    waits only for the sends already running.
+    """
+
+    def __init__(self):
+        self._tasks = None
+        self._workers = []
+        self._slots = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def threads(self):
+        return getattr(settings, 'NOTIFICATION_DISPATCH_THREADS', 2)
+
+    def _start(self):
+        with self._lock:
+            if self._tasks is None and not self._closed:
+                queue_size = getattr(settings, 'NOTIFICATION_DISPATCH_QUEUE', 50)
+                # One slot per running or waiting task
+                self._slots = threading.BoundedSemaphore(self.threads + queue_size)
+                self._tasks = queue.SimpleQueue()
+                self._workers = [
+                    threading.Thread(target=self._work, name=f'notifications_{number}', daemon=True)
+                    for number in range(self.threads)
+                ]
+                for worker in self._workers:
+                    worker.start()
+            return self._tasks
+
+    def submit(self, func, *args):
+        """
+        Run func(*args) on the pool.
+
+        Returns:
+            bool: False if the dispatcher is off, full or shutting down;
+                  the caller keeps the work
+        """
+        if self.threads <= 0 or self._closed:
+            return False
+        tasks = self._start()
+        if tasks is None or not self._slots.acquire(blocking=False):
+            return False
+        tasks.put((func, args))
+        return True
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            func, args = task
+            try:
+                if not self._closed:
+                    func(*args)
+            except Exception as e:
+                logger.error(f"Notification dispatch failed: {str(e)}")
+            finally:
+                self._slots.release()
+                # Each pool thread has its own database connection
+                connections.close_all()
+
+    def shutdown(self, wait=True):
+        """
+        Stop taking work, drop waiting tasks and wait for running ones.
+        Later calls do nothing.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = self._workers
+        # Workers skip the tasks still queued ahead of their stop marker
+        for _ in workers:
+            self._tasks.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.shutdown)
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from restaurant.digest import send_due_digests
+from restaurant.outbox import drain, get_batch_size
+
+
+class Command(BaseCommand):
+    help = 'Send the queued notification emails in batches, retrying failures with backoff, and the staff digest when due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=get_batch_size(),
+            help='Emails claimed per batch (default: NOTIFICATION_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll for new emails',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls with --loop (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                counts = drain(batch_size=options['batch_size'])
+                digests = send_due_digests()
+                if digests:
+                    self.stdout.write(self.style.SUCCESS(f'Staff digests sent: {digests}'))
+                if any(counts.values()) or not options['loop']:
+                    summary = f"Sent: {counts['sent']}, Retrying: {counts['retried']}, Failed for good: {counts['dead']}"
+                    if counts['retried'] or counts['dead']:
+                        self.stdout.write(self.style.WARNING(f'Notifications drained with failures. {summary}'))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f'Notifications drained. {summary}'))
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            # Rows claimed by an interrupted batch are picked up again after NOTIFICATION_CLAIM_TIMEOUT
+            self.stdout.write('Stopped.')
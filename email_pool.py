@@ -0,0 +1,121 @@
+"""
+Reusable mail connections.
+Opening an SMTP connection to Gmail costs a TCP connect, STARTTLS and a
+login, so messages are sent over pooled get_connection() connections that
+stay open between batches. A connection idle for EMAIL_POOL_CHECK_AFTER
+seconds is checked with NOOP before reuse, and one older than
+EMAIL_POOL_MAX_AGE seconds is replaced, since servers drop long-lived
+sessions.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection:
+    """
+    An open mail backend connection with the times the pool needs.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.opened_at = self.used_at = time.monotonic()
+
+    def is_healthy(self, force=False):
+        """
+        False if the connection should not be used again. Recently used
+        connections skip the NOOP round trip unless `force` is set.
+        """
+        now = time.monotonic()
+        if now - self.opened_at > getattr(settings, 'EMAIL_POOL_MAX_AGE', 300):
+            return False
+        if not isinstance(self.backend, SMTPBackend):
+            # console, file and locmem backends hold no socket
+            return True
+        if self.backend.connection is None:
+            return False
+        if not force and now - self.used_at < getattr(settings, 'EMAIL_POOL_CHECK_AFTER', 30):
+            return True
+        try:
+            return self.backend.connection.noop()[0] == 250
+        except Exception:
+            return False
+
+    def reopen(self):
+        self.close()
+        self.backend.open()
+        self.opened_at = self.used_at = time.monotonic()
+
+    def close(self):
+        try:
+            self.backend.close()
+        except Exception as e:
+            logger.warning(f"Failed to close mail connection: {str(e)}")
+
+
+class ConnectionPool:
+    """
+    Up to EMAIL_POOL_SIZE idle connections, shared by the threads of a process.
+    """
+
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                break
+            if pooled.is_healthy():
+                return pooled
+            pooled.close()
+
+        backend = get_connection(fail_silently=False)
+        backend.open()
+        return PooledConnection(backend)
+
+    def release(self, pooled):
+        pooled.used_at = time.monotonic()
+        with self._lock:
+            if len(self._idle) < getattr(settings, 'EMAIL_POOL_SIZE', 2):
+                self._idle.append(pooled)
+                return
+        pooled.close()
+
+    def discard(self, pooled):
+        pooled.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        A healthy connection for the duration of the block. It goes back to
+        the pool afterwards, unless the block failed with the connection broken.
+        """
+        pooled = self.acquire()
+        try:
+            yield pooled
+        except Exception:
+            self.discard(pooled)
+            raise
+        self.release(pooled)
+
+
+pool = ConnectionPool()
+atexit.register(pool.close_all)
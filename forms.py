@@ -1,7 +1,19 @@
 from django import forms
 from .models import Reservation
+from .capacity import get_slot_minutes, snap_to_slot
 
-class ReservationForm(forms.ModelForm):
+
+class SlotTimeMixin:
+    """
+    Snaps the reservation time to the slot grid (RESERVATION_SLOT_MINUTES),
+    so 19:07 and 19:10 are both booked as 19:00 and share one slot.
+    """
+    def clean_time(self):
+        time = self.cleaned_data.get('time')
+        return snap_to_slot(time) if time is not None else time
+
+
+class ReservationForm(SlotTimeMixin, forms.ModelForm):
     # Add fields for the customer's details
     name = forms.CharField(
         max_length=120, 
@@ -43,6 +55,7 @@ class ReservationForm(forms.ModelForm):
             'time': forms.TimeInput(
                 attrs={
                     'type': 'time', # This adds a time picker
+                    'step': str(get_slot_minutes() * 60), # Picker steps along the slot grid
                     'class': 'w-full px-4 py-2 border border-gray-300 rounded-md shadow-sm focus:ring-indigo-500 focus:border-indigo-500'
                 }
             ),
@@ -52,4 +65,10 @@ class ReservationForm(forms.ModelForm):
                     'class': 'w-full px-4 py-2 border border-gray-300 rounded-md shadow-sm focus:ring-indigo-500 focus:border-indigo-500'
                 }
             )
-        }
\ No newline at end of file
+        }
+
+
+class ReservationAdminForm(SlotTimeMixin, forms.ModelForm):
+    class Meta:
+        model = Reservation
+        fields = '__all__'
\ No newline at end of file
@@ -0,0 +1,183 @@
+"""
+Responsive image derivatives for site imagery.
+Resizes each source image in settings.RESPONSIVE_IMAGES to several widths
+in AVIF/WebP with content-hashed names, and records them in a manifest that
+the responsive_images template tags read. Remote sources are downloaded once
+and cached locally.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.templatetags.static import static
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+# Pillow save options per output format
+FORMAT_OPTIONS = {
+    'avif': {'format': 'AVIF', 'quality': 55},
+    'webp': {'format': 'WEBP', 'quality': 78, 'method': 6},
+}
+
+DOWNLOAD_TIMEOUT = 20  # seconds
+
+# Parsed manifest and the mtime it was read at, so tags re-read it only after a rebuild
+_manifest_cache = {'mtime': None, 'manifest': {}}
+
+
+def get_output_root():
+    return Path(getattr(settings, 'RESPONSIVE_IMAGE_ROOT', settings.BASE_DIR / 'static' / 'img' / 'responsive'))
+
+
+def get_static_prefix():
+    # Path of the output directory relative to the static root, e.g. 'img/responsive/'
+    return getattr(settings, 'RESPONSIVE_IMAGE_STATIC_PREFIX', 'img/responsive/')
+
+
+def load_manifest():
+    """
+    Return {name: entry} for every built image, or {} before the first build.
+    """
+    path = get_output_root() / MANIFEST_NAME
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return {}
+    if _manifest_cache['mtime'] != mtime:
+        try:
+            _manifest_cache['manifest'] = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            _manifest_cache['manifest'] = {}
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['manifest']
+
+
+def image_url(relative_path):
+    return static(get_static_prefix() + relative_path)
+
+
+def fetch_source(name, source, refresh=False):
+    """
+    Return the bytes of a source image. Remote URLs are cached under
+    <output root>/sources/ so they are downloaded only once.
+    """
+    source = str(source)
+    if not source.startswith(('http://', 'https://')):
+        return Path(source).read_bytes()
+
+    cache_path = get_output_root() / 'sources' / name
+    if cache_path.exists() and not refresh:
+        return cache_path.read_bytes()
+
+    request = urllib.request.Request(source, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+        data = response.read()
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache_path.write_bytes(data)
+    return data
+
+
+def build_derivatives(name, source_bytes, widths, formats):
+    """
+    Write resized variants of one image and return its manifest entry.
+    Widths larger than the source are skipped; the source width is used
+    instead so the largest variant is never upscaled.
+    """
+    from PIL import Image, ImageOps
+
+    root = get_output_root()
+    with Image.open(io.BytesIO(source_bytes)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        source_width, source_height = image.size
+
+        target_widths = sorted({min(width, source_width) for width in widths})
+        variants = []
+        for width in target_widths:
+            height = round(source_height * width / source_width)
+            resized = image if width == source_width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                buffer = io.BytesIO()
+                resized.save(buffer, **FORMAT_OPTIONS[fmt])
+                data = buffer.getvalue()
+                file_name = f'{name}-{width}w.{hashlib.sha256(data).hexdigest()[:10]}.{fmt}'
+                (root / file_name).write_bytes(data)
+                variants.append({'width': width, 'height': height, 'format': fmt, 'path': file_name})
+
+    return {
+        'source_hash': hashlib.sha256(source_bytes).hexdigest(),
+        'width': source_width,
+        'height': source_height,
+        'variants': variants,
+    }
+
+
+def build_responsive_images(refresh=False, force=False, log=None):
+    """
+    Build derivatives for every configured image.
+
+    Args:
+        refresh: Download remote sources again instead of using the local copy
+        force: Rebuild images whose source did not change
+        log: Optional callable for progress messages
+
+    Returns:
+        dict: The new manifest
+    """
+    from PIL import features
+
+    log = log or logger.info
+    root = get_output_root()
+    root.mkdir(parents=True, exist_ok=True)
+
+    formats = [
+        fmt for fmt in getattr(settings, 'RESPONSIVE_IMAGE_FORMATS', ['avif', 'webp'])
+        if features.check(fmt)
+    ]
+    widths = getattr(settings, 'RESPONSIVE_IMAGE_WIDTHS', [480, 800, 1200, 1920])
+    previous = load_manifest()
+    manifest = {}
+
+    for name, source in getattr(settings, 'RESPONSIVE_IMAGES', {}).items():
+        try:
+            source_bytes = fetch_source(name, source, refresh=refresh)
+        except OSError as e:
+            log(f'Skipping {name}: could not read {source} ({e})')
+            if name in previous:
+                manifest[name] = previous[name]
+            continue
+
+        entry = previous.get(name)
+        unchanged = (
+            entry is not None
+            and entry['source_hash'] == hashlib.sha256(source_bytes).hexdigest()
+            and {variant['format'] for variant in entry['variants']} == set(formats)
+            and all((root / variant['path']).exists() for variant in entry['variants'])
+        )
+        if unchanged and not force:
+            manifest[name] = entry
+            log(f'{name}: unchanged')
+            continue
+
+        manifest[name] = build_derivatives(name, source_bytes, widths, formats)
+        log(f"{name}: {len(manifest[name]['variants'])} variants")
+
+    # Remove derivatives that no manifest entry points to any more
+    keep = {variant['path'] for entry in manifest.values() for variant in entry['variants']}
+    for path in root.iterdir():
+        if path.is_file() and path.name != MANIFEST_NAME and path.name not in keep:
+            path.unlink()
+
+    tmp_path = root / (MANIFEST_NAME + '.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    os.replace(tmp_path, root / MANIFEST_NAME)
+    return manifest
@@ -0,0 +1,123 @@
+"""
+Precompiled menu artifacts.
+Renders the menu JSON and the menu page to content-hashed files with gzip
+and brotli variants, so a web server can serve them with far-future cache
+headers without calling into Django. A manifest.json names the current files.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .menu_cache import get_menu_snapshot
+from .serializers import MenuItemSerializer
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; only .gz variants are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def get_artifact_root():
+    return Path(getattr(settings, 'MENU_ARTIFACT_ROOT', settings.BASE_DIR / 'menu_artifacts'))
+
+
+def _write_atomic(path, data):
+    # Write to a temp file first so a web server never serves a half-written file
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _write_with_variants(root, name, data):
+    _write_atomic(root / name, data)
+    _write_atomic(root / (name + '.gz'), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(root / (name + '.br'), brotli.compress(data, quality=11))
+
+
+def _content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def read_manifest():
+    """
+    Return the current artifact manifest, or None if nothing was built yet.
+    """
+    try:
+        return json.loads((get_artifact_root() / MANIFEST_NAME).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def render_menu_json():
+    categories = []
+    for category in get_menu_snapshot():
+        categories.append({
+            'name': category['name'],
+            'items': MenuItemSerializer(category['items'], many=True).data,
+        })
+    return json.dumps(
+        {'categories': categories}, ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def build_menu_artifacts(force=False):
+    """
+    Build the menu artifacts if the menu content changed since the last build.
+
+    Args:
+        force: Rebuild even if the menu content hash is unchanged
+               (e.g. after a template change)
+
+    Returns:
+        dict: The manifest, with 'skipped': True when nothing was rebuilt
+    """
+    root = get_artifact_root()
+    root.mkdir(parents=True, exist_ok=True)
+
+    menu_json = render_menu_json()
+    content_hash = _content_hash(menu_json)
+    previous = read_manifest()
+    if not force and previous and previous.get('content_hash') == content_hash:
+        return dict(previous, skipped=True)
+
+    started = time.perf_counter()
+    html = render_to_string('menu.html', {'categories': get_menu_snapshot()}).encode('utf-8')
+
+    json_name = f'menu.{content_hash}.json'
+    html_name = f'menu.{_content_hash(html)}.html'
+    _write_with_variants(root, json_name, menu_json)
+    _write_with_variants(root, html_name, html)
+
+    manifest = {
+        'content_hash': content_hash,
+        'json': json_name,
+        'html': html_name,
+        'built_at': int(time.time()),
+    }
+    # The manifest is small and short-lived in caches; write it last
+    _write_atomic(root / MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8'))
+
+    # Keep the previous build for clients that still hold the old manifest
+    keep = {json_name, html_name}
+    if previous:
+        keep.update({previous.get('json'), previous.get('html')})
+    for path in root.glob('menu.*'):
+        base_name = path.name.removesuffix('.gz').removesuffix('.br')
+        if base_name not in keep:
+            path.unlink(missing_ok=True)
+
+    logger.info(f"Menu artifacts built in {(time.perf_counter() - started) * 1000:.0f} ms ({content_hash})")
+    return dict(manifest, skipped=False)
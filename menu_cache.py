@@ -0,0 +1,195 @@
+"""
+Menu snapshot cache for the menu page.
+Fetches every available menu item in one query, groups the items by category
+and keeps the result in Django's cache under a version number that is bumped
+whenever menu data changes. The rendered menu page is cached per version too.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+from django.template.loader import render_to_string
+from django.utils.text import compress_string
+
+from .cache_versions import bump_version, get_version
+from .models import MenuItem
+
+# Cache key holding the current menu version
+MENU_VERSION_KEY = 'menu:version'
+
+# Cache key template for the grouped menu snapshot of one version
+MENU_SNAPSHOT_KEY = 'menu:snapshot:{version}'
+
+# Cache key holding the time (epoch seconds) of the last menu change
+MENU_LAST_MODIFIED_KEY = 'menu:last_modified'
+
+# Cache key template for the rendered menu page of one version
+MENU_PAGE_KEY = 'menu:page:{version}:{eager}'
+
+# Snapshots and pages of a replaced version are deleted when the menu
+# version is bumped; this timeout clears any that a request still rendering
+# the old version stores after that
+MENU_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Cache key template for one rendered category fragment. Keyed by the digest
+# of the category's items, so it survives changes to other categories
+MENU_FRAGMENT_KEY = 'menu:fragment:{category}:{index}:{digest}'
+
+# Sent after every menu version bump, for work that follows menu changes
+menu_changed = Signal()
+
+# Last snapshot seen by this process, so repeat hits skip unpickling it
+_local_snapshot = {'version': None, 'categories': None}
+
+
+def get_menu_version():
+    """
+    Return the current menu version, creating it if the cache has none.
+    """
+    return get_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version():
+    """
+    Invalidate the menu snapshot by moving to a new version.
+    Called whenever menu items are saved, deleted or bulk-updated.
+    """
+    cache.set(MENU_LAST_MODIFIED_KEY, time.time(), timeout=None)
+    version = bump_version(MENU_VERSION_KEY)
+    if version is None:
+        # No version stored yet, so there is nothing stale to invalidate
+        version = get_menu_version()
+    else:
+        # Nothing asks for the previous version again
+        cache.delete_many([
+            MENU_SNAPSHOT_KEY.format(version=version - 1),
+            MENU_PAGE_KEY.format(version=version - 1, eager=get_eager_categories()),
+        ])
+    menu_changed.send(sender=MenuItem, version=version)
+    return version
+
+
+def get_menu_last_modified():
+    """
+    Return the time of the last menu change as epoch seconds.
+    """
+    last_modified = cache.get(MENU_LAST_MODIFIED_KEY)
+    if last_modified is None:
+        cache.add(MENU_LAST_MODIFIED_KEY, time.time(), timeout=None)
+        last_modified = cache.get(MENU_LAST_MODIFIED_KEY)
+    return last_modified
+
+
+def _items_digest(items):
+    # Covers every field the menu templates render
+    content = [[item.id, item.name, item.description, item.sizes_and_prices] for item in items]
+    return hashlib.sha1(json.dumps(content, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def get_eager_categories():
+    """
+    Number of categories rendered inline on the menu page; the rest load as
+    fragments. 0 renders the whole menu in one response.
+    """
+    return getattr(settings, 'MENU_EAGER_CATEGORIES', 0)
+
+
+def build_menu_snapshot():
+    """
+    Build the menu page categories from a single query.
+
+    Returns:
+        list: One dict per non-empty category, in CATEGORY_CHOICES order,
+              e.g. {'key': 'soups', 'name': 'Soups', 'items': [MenuItem, ...],
+                    'digest': '<hash of the rendered item fields>'}
+    """
+    items_by_category = {}
+    for item in MenuItem.objects.filter(available=True).order_by('category', 'id'):
+        items_by_category.setdefault(item.category, []).append(item)
+
+    categories = []
+    for category_key, category_label in MenuItem.CATEGORY_CHOICES:
+        category_items = items_by_category.get(category_key)
+        # Only add the category to our list if it has items
+        if category_items:
+            categories.append({
+                'key': category_key,
+                'name': category_label,
+                'items': category_items,
+                'digest': _items_digest(category_items),
+            })
+    return categories
+
+
+def get_menu_snapshot(version=None):
+    """
+    Return the grouped menu for `version` (the current version by default),
+    building it at most once per version.
+    """
+    if version is None:
+        version = get_menu_version()
+    if _local_snapshot['version'] == version:
+        return _local_snapshot['categories']
+
+    snapshot_key = MENU_SNAPSHOT_KEY.format(version=version)
+    categories = cache.get(snapshot_key)
+    if categories is None:
+        categories = build_menu_snapshot()
+        cache.set(snapshot_key, categories, timeout=MENU_CACHE_TIMEOUT)
+
+    _local_snapshot['version'] = version
+    _local_snapshot['categories'] = categories
+    return categories
+
+
+def get_menu_page(request, version):
+    """
+    Return the rendered menu page for a menu version, rendering it at most
+    once per version.
+
+    Returns:
+        dict: {'body': bytes, 'gzip': bytes} with the plain and gzipped HTML
+    """
+    eager_categories = get_eager_categories()
+    page_key = MENU_PAGE_KEY.format(version=version, eager=eager_categories)
+    page = cache.get(page_key)
+    if page is None:
+        # The snapshot of the same version, so the key, ETag and body agree
+        # even if the menu changes while the page is rendered
+        context = {'categories': get_menu_snapshot(version), 'eager_categories': eager_categories}
+        body = render_to_string('menu.html', context, request=request).encode('utf-8')
+        page = {'body': body, 'gzip': compress_string(body)}
+        cache.set(page_key, page, timeout=MENU_CACHE_TIMEOUT)
+    return page
+
+
+def find_menu_category(category_key):
+    """
+    Return (index, category) for a category key from the current snapshot,
+    or (None, None) if the category has no available items.
+    """
+    for index, category in enumerate(get_menu_snapshot()):
+        if category['key'] == category_key:
+            return index, category
+    return None, None
+
+
+def get_menu_fragment(request, index, category):
+    """
+    Return the rendered items of one menu category, rendering it only when
+    that category's items changed.
+    """
+    fragment_key = MENU_FRAGMENT_KEY.format(
+        category=category['key'], index=index, digest=category['digest']
+    )
+    fragment = cache.get(fragment_key)
+    if fragment is None:
+        fragment = render_to_string(
+            'menu_category.html', {'category': category, 'category_index': index}, request=request
+        ).encode('utf-8')
+        cache.set(fragment_key, fragment, timeout=None)
+    return fragment
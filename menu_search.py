@@ -0,0 +1,60 @@
+"""
+Server-side menu search.
+On SQLite this queries the FTS5 index created in migration 0006, which
+triggers keep in sync with the menu table. Other databases fall back to
+a plain icontains query.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import MenuItem
+
+# Default and maximum number of results returned by a search
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+
+# bm25 column weights: name, description, category, sub_category
+SEARCH_SQL = """
+    SELECT m.*
+    FROM restaurant_menuitem_fts
+    JOIN restaurant_menuitem m ON m.id = restaurant_menuitem_fts.rowid
+    WHERE restaurant_menuitem_fts MATCH %s AND m.available
+    ORDER BY bm25(restaurant_menuitem_fts, 10.0, 1.0, 4.0, 4.0), m.name
+    LIMIT %s
+"""
+
+
+def _search_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def search_menu_items(query, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Search available menu items by name, description and category labels.
+    Every word must match, and the last characters typed may be a prefix.
+
+    Args:
+        query: Raw search text from the user
+        limit: Maximum number of results
+
+    Returns:
+        list: MenuItem objects, best match first
+    """
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    if connection.vendor != 'sqlite':
+        items = MenuItem.objects.filter(available=True)
+        for term in terms:
+            items = items.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return list(items.order_by('name')[:limit])
+
+    # Quote each term so FTS5 operators in user input are read as text,
+    # and make each one a prefix query
+    match = ' '.join('"{}"*'.format(term) for term in terms)
+    return list(MenuItem.objects.raw(SEARCH_SQL, [match, limit]))
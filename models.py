@@ -1,6 +1,88 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.db.models import JSONField # Import the standard, built-in JSONField
 
+
+def parse_price(price):
+    """
+    Return a sizes_and_prices price as a Decimal, or None if it is not a
+    number. Numeric strings such as "50" count as prices.
+    """
+    if isinstance(price, bool) or not isinstance(price, (int, float, str)):
+        return None
+    try:
+        value = Decimal(str(price).strip())
+    except InvalidOperation:
+        return None
+    # Decimal() accepts "NaN" and "Infinity"
+    return value if value.is_finite() else None
+
+
+def summarize_prices(sizes_and_prices):
+    """
+    Derive (min_price, max_price, variant_count) from a sizes_and_prices list.
+    Entries without a numeric price are counted as variants but not priced.
+    """
+    sizes_and_prices = sizes_and_prices or []
+    prices = [
+        price for price in (
+            parse_price(entry.get('price')) for entry in sizes_and_prices if isinstance(entry, dict)
+        )
+        if price is not None
+    ]
+    if not prices:
+        return None, None, len(sizes_and_prices)
+    return min(prices), max(prices), len(sizes_and_prices)
+
+
+def format_price(value):
+    # Decimal('140.00') -> '140', Decimal('99.50') -> '99.5'
+    return f"{value.normalize():f}"
+
+
+# Price columns kept in sync with sizes_and_prices
+PRICE_SUMMARY_FIELDS = ('min_price', 'max_price', 'variant_count')
+
+
+class MenuItemQuerySet(models.QuerySet):
+    """
+    Keeps the denormalized price columns in sync on bulk writes,
+    which bypass MenuItem.save().
+    """
+
+    def update(self, **kwargs):
+        if 'sizes_and_prices' in kwargs and not hasattr(kwargs['sizes_and_prices'], 'resolve_expression'):
+            kwargs.update(zip(PRICE_SUMMARY_FIELDS, summarize_prices(kwargs['sizes_and_prices'])))
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_price_summary()
+        update_fields = kwargs.get('update_fields')
+        if update_fields and 'sizes_and_prices' in update_fields:
+            kwargs['update_fields'] = [*update_fields, *PRICE_SUMMARY_FIELDS]
+        return super().bulk_create(objs, *args, **kwargs)
+
+    bulk_create.alters_data = True
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if 'sizes_and_prices' in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.refresh_price_summary()
+            fields += PRICE_SUMMARY_FIELDS
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    bulk_update.alters_data = True
+
+
 class MenuItem(models.Model):
     # Comprehensive categories based on the menu card
     CATEGORY_CHOICES = [
@@ -110,24 +192,114 @@ class MenuItem(models.Model):
     
     available = models.BooleanField(default=True)
     
+    # Denormalized from sizes_and_prices so prices can be filtered and sorted in SQL.
+    # Never edit these directly - they are recomputed on every save.
+    min_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True, editable=False, db_index=True)
+    max_price = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True, editable=False, db_index=True)
+    variant_count = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    objects = MenuItemQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Menu page snapshot: available items in category order. Partial, because
+            # SQLite cannot use a plain index for a bare boolean WHERE "available"
+            models.Index(fields=['category'], condition=models.Q(available=True), name='menuitem_available_cat_idx'),
+            # Admin changelist default ordering and category/sub-category filters
+            models.Index(fields=['category', 'sub_category', 'name'], name='menuitem_cat_subcat_name_idx'),
+        ]
+    
+    def refresh_price_summary(self):
+        """
+        Recompute min_price, max_price and variant_count from sizes_and_prices.
+        """
+        self.min_price, self.max_price, self.variant_count = summarize_prices(self.sizes_and_prices)
+    
+    def save(self, *args, **kwargs):
+        self.refresh_price_summary()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'sizes_and_prices' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *PRICE_SUMMARY_FIELDS}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         # Display the lowest price for the admin list
-        if self.sizes_and_prices:
-            try:
-                min_price = min(item['price'] for item in self.sizes_and_prices if item.get('price') is not None)
-                return f"{self.name} — from ₹{min_price}"
-            except ValueError:
-                pass
+        if self.min_price is not None:
+            return f"{self.name} — from ₹{format_price(self.min_price)}"
         return self.name
 
+def normalize_email(email):
+    """
+    Lookup key for an email address: guests type the same address with
+    different casing and stray spaces.
+    """
+    return (email or '').strip().lower()
+
+
+class CustomerQuerySet(models.QuerySet):
+
+    def upsert(self, email, name, phone=''):
+        """
+        Create the customer for an email, or update the name and phone of
+        the existing one, in a single INSERT ... ON CONFLICT statement.
+        Emails match case-insensitively through email_normalized.
+        """
+        customer = Customer(
+            email=email.strip(), email_normalized=normalize_email(email), name=name, phone=phone
+        )
+        self.bulk_create(
+            [customer],
+            update_conflicts=True,
+            unique_fields=['email_normalized'],
+            update_fields=['name', 'phone'],
+        )
+        if customer.pk is None:
+            # Backends that cannot return the id of an upserted row
+            customer = self.get(email_normalized=customer.email_normalized)
+        return customer
+
+    upsert.alters_data = True
+
+
 class Customer(models.Model):
     name = models.CharField(max_length=120)
     email = models.EmailField(unique=True) 
+    # Lower-cased email, so returning guests are found whatever the casing
+    email_normalized = models.EmailField(unique=True, editable=False)
     phone = models.CharField(max_length=30, blank=True)
     
+    objects = CustomerQuerySet.as_manager()
+    
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_email(self.email)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'email' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'email_normalized'}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.name
 
+class Table(models.Model):
+    """
+    A physical table. Tables with the same combine_group can be pushed
+    together for larger parties.
+    """
+    name = models.CharField(max_length=30, unique=True, help_text='e.g. T1, Patio 3')
+    seats = models.PositiveSmallIntegerField()
+    combine_group = models.CharField(
+        max_length=30, blank=True,
+        help_text='Tables in the same group can be combined. Leave empty if this table stands alone'
+    )
+    active = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['seats', 'name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.seats} seats)"
+
+
 class Reservation(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='reservations')
     date = models.DateField()
@@ -135,9 +307,202 @@ class Reservation(models.Model):
     guests = models.PositiveIntegerField(default=1) 
     created_at = models.DateTimeField(auto_now_add=True)
     confirmed = models.BooleanField(default=False)
+    # Assigned when the booking is admitted (see capacity.admit_reservation)
+    tables = models.ManyToManyField(Table, blank=True, related_name='reservations')
     
     # No unique_together constraint - multiple reservations allowed per time slot
     # Total capacity is checked in the view logic
+    
+    class Meta:
+        indexes = [
+            # Covers the per-slot SUM(guests) capacity check without touching the table
+            models.Index(fields=['date', 'time', 'guests'], name='reservation_slot_guests_idx'),
+            # Unconfirmed reservations by date (admin "confirmed" filter)
+            models.Index(fields=['date', 'time'], condition=models.Q(confirmed=False), name='reservation_unconfirmed_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reservation {self.id} for {self.customer} on {self.date} {self.time} ({self.guests} guests)"
 
+
+class Waitlist(models.Model):
+    """
+    A party waiting for a full slot. promote_waitlist turns entries into
+    reservations, first come first served, when seats free up.
+    """
+    WAITING = 'waiting'
+    PROMOTED = 'promoted'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (WAITING, 'Waiting'),
+        (PROMOTED, 'Promoted'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='waitlist')
+    date = models.DateField()
+    time = models.TimeField()
+    guests = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    promoted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    reservation = models.OneToOneField(
+        Reservation, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='waitlist_entry'
+    )
+    
+    class Meta:
+        ordering = ['date', 'time', 'created_at']
+        indexes = [
+            # Promotion: waiting parties per slot, oldest first
+            models.Index(fields=['date', 'time', 'created_at'], condition=models.Q(status='waiting'), name='waitlist_waiting_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Waitlist {self.id} for {self.customer} on {self.date} {self.time} ({self.guests} guests, {self.status})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    An email waiting to be sent. Rows are written in the same transaction
+    as the reservation they announce, and drain_notifications sends them,
+    so a booking never waits on the mail server. idempotency_key makes
+    queuing the same email twice a no-op.
+    """
+    STAFF_RESERVATION = 'staff_reservation'
+    CUSTOMER_RESERVATION = 'customer_reservation'
+    WAITLIST_PROMOTION = 'waitlist_promotion'
+    KIND_CHOICES = [
+        (STAFF_RESERVATION, 'New reservation (staff)'),
+        (CUSTOMER_RESERVATION, 'Reservation received (customer)'),
+        (WAITLIST_PROMOTION, 'Waitlist promotion (customer)'),
+    ]
+    
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Failed for good'),
+    ]
+    
+    idempotency_key = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    reservation = models.ForeignKey(
+        Reservation, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # drain_notifications: due rows, oldest first
+            models.Index(fields=['next_attempt_at'], condition=models.Q(status='pending'), name='outbox_pending_idx'),
+            # Rows claimed by a worker that died mid-batch
+            models.Index(fields=['claimed_at'], condition=models.Q(status='sending'), name='outbox_sending_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} for reservation {self.reservation_id} ({self.status})"
+
+
+class StaffDigest(models.Model):
+    """
+    Digest progress per staff recipient: reservations with an id up to
+    last_reservation_id have been sent to them (see digest.py).
+    """
+    recipient = models.EmailField(unique=True)
+    last_reservation_id = models.PositiveBigIntegerField(default=0)
+    last_sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Digest for {self.recipient} (up to reservation {self.last_reservation_id})"
+
+
+class ReservationSlot(models.Model):
+    """
+    Materialized seat count per (date, time) start time.
+    booked_guests is kept in step with Reservation by the signal handlers in
+    signals.py; reconcile_reservation_slots rebuilds it from scratch.
+    Seats and seating length come from CapacityRule rather than a capacity
+    column here: seatings that start at different times share the same
+    seats, so capacity belongs to the service, not to one start time.
+    """
+    date = models.DateField()
+    time = models.TimeField()
+    booked_guests = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'time'], name='unique_reservation_slot'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.time}: {self.booked_guests} guests"
+
+
+class CapacityRule(models.Model):
+    """
+    Seats and seating length for one service, e.g. weekday dinner.
+    Rules for a specific date replace the weekday rules for that day, and
+    weekday rules replace the rules for every day. Without any rules the
+    RESERVATION_* defaults in settings apply.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    name = models.CharField(max_length=60, help_text='e.g. Lunch, Dinner')
+    date = models.DateField(null=True, blank=True, help_text='Only on this date, e.g. a holiday')
+    weekday = models.PositiveSmallIntegerField(
+        choices=WEEKDAY_CHOICES, null=True, blank=True,
+        help_text='Every week on this day. Leave date and weekday empty for every day'
+    )
+    start_time = models.TimeField(help_text='First seating')
+    end_time = models.TimeField(help_text='Last seating')
+    capacity = models.PositiveIntegerField(default=45, help_text='Seats in use at any moment')
+    seating_minutes = models.PositiveSmallIntegerField(default=90, help_text='How long a table stays occupied')
+    
+    class Meta:
+        ordering = ['date', 'weekday', 'start_time']
+    
+    def clean(self):
+        if self.date is not None and self.weekday is not None:
+            raise ValidationError('Set either a date or a weekday, not both.')
+        if self.start_time and self.end_time and self.start_time > self.end_time:
+            raise ValidationError('The last seating must not be before the first seating.')
+        if self.seating_minutes == 0:
+            raise ValidationError({'seating_minutes': 'A seating must last at least one minute.'})
+    
+    def applies_to(self, date):
+        if self.date is not None:
+            return self.date == date
+        if self.weekday is not None:
+            return self.weekday == date.weekday()
+        return True
+    
+    def covers(self, time):
+        return self.start_time <= time <= self.end_time
+    
     def __str__(self):
-        return f"Reservation {self.id} for {self.customer} on {self.date} {self.time} ({self.guests} guests)"
\ No newline at end of file
+        if self.date is not None:
+            days = self.date.isoformat()
+        elif self.weekday is not None:
+            days = self.get_weekday_display()
+        else:
+            days = 'Every day'
+        return f"{self.name} ({days} {self.start_time:%H:%M}-{self.end_time:%H:%M}, {self.capacity} seats)"
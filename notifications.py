@@ -1,150 +1,205 @@
 """
-Email notification functions for restaurant reservations.
-Sends notifications to staff and customers when reservations are made.
+Email notifications for restaurant reservations.
+The *_email builders return unsent messages for staff and customers; the
+notification outbox (see outbox.py) is the one path that sends them, so it
+can retry on failure; send_all_notifications queues a reservation's emails
+there. Messages are sent in batches over one pooled connection (see
+email_pool.py).
+
+Bodies are Django templates (email_*.txt for the text part, email_*.html
+for the HTML alternative), compiled once by the cached template loader.
+The restaurant footer and contact blocks are the same in every email, so
+they are rendered once per process and passed in as context.
 """
 
-from django.core.mail import send_mail
+from functools import lru_cache
+
+from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
 import logging
+import time
+
+from .email_pool import pool
 
 logger = logging.getLogger(__name__)
 
 
-def send_reservation_email_to_staff(reservation, customer):
+@lru_cache(maxsize=None)
+def shared_blocks():
+    """
+    The footer and contact blocks, rendered on first use.
+    """
+    return {
+        'footer_text': render_to_string('email_footer.txt').strip(),
+        'footer_html': mark_safe(render_to_string('email_footer.html')),
+        'contact_text': render_to_string('email_contact.txt').strip(),
+        'contact_html': mark_safe(render_to_string('email_contact.html')),
+    }
+
+
+def render_email(template_name, subject, to, context):
     """
-    Send email notification to restaurant staff about a new reservation.
-    
+    Build a text email with an HTML alternative from
+    `template_name`.txt and `template_name`.html.
+
+    Returns:
+        EmailMultiAlternatives: The unsent email
+    """
+    context = {**shared_blocks(), **context}
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=get_template(f'{template_name}.txt').render(context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=to,
+    )
+    message.attach_alternative(get_template(f'{template_name}.html').render(context), 'text/html')
+    return message
+
+
+def reservation_email_to_staff(reservation, customer):
+    """
+    Build the email to restaurant staff about a new reservation.
+
     Args:
         reservation: Reservation object
         customer: Customer object
-    
+
     Returns:
-        bool: True if email sent successfully, False otherwise
+        EmailMultiAlternatives: The unsent email
     """
-    try:
-        subject = f'New Reservation - Mata Pita Da Dhaba'
-        
-        message = f"""
-New Reservation Received!
-
-Customer Details:
------------------
-Name: {customer.name}
-Email: {customer.email}
-Phone: {customer.phone}
-
-Reservation Details:
--------------------
-Date: {reservation.date.strftime('%B %d, %Y')}
-Time: {reservation.time.strftime('%I:%M %p')}
-Number of Guests: {reservation.guests}
-
-Please contact the customer to confirm the reservation.
-
----
-Mata Pita Da Dhaba
-Sai Wadi, Madh, Marve Road, Malad West, Mumbai
-Phone: +91-9373066280
-        """
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.MANAGER_EMAIL],
-            fail_silently=False,
-        )
-        
-        logger.info(f"Staff notification email sent for reservation {reservation.id}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to send staff email: {str(e)}")
-        return False
+    return render_email(
+        'email_reservation_staff',
+        subject='New Reservation - Mata Pita Da Dhaba',
+        to=[settings.MANAGER_EMAIL],
+        context={'reservation': reservation, 'customer': customer},
+    )
 
 
-def send_reservation_email_to_customer(reservation, customer):
+def reservation_email_to_customer(reservation, customer):
     """
-    Send confirmation email to customer about their reservation.
-    
+    Build the confirmation email to the customer about their reservation.
+
     Args:
         reservation: Reservation object
         customer: Customer object
-    
+
     Returns:
-        bool: True if email sent successfully, False otherwise
+        EmailMultiAlternatives: The unsent email
     """
-    try:
-        subject = f'Reservation Confirmation - Mata Pita Da Dhaba'
-        
-        message = f"""
-Dear {customer.name},
-
-Thank you for choosing Mata Pita Da Dhaba!
-
-Your reservation has been received and is pending confirmation.
-
-Reservation Details:
--------------------
-Date: {reservation.date.strftime('%B %d, %Y')}
-Time: {reservation.time.strftime('%I:%M %p')}
-Number of Guests: {reservation.guests}
-
-We will contact you shortly at {customer.phone} to confirm your reservation.
-
-If you need to make any changes, please contact us:
-Phone: +91-9373066280
-Email: siddhantjagtap0707@gmail.com
-
-Location:
-Sai Wadi, Madh, Marve Road, Malad West, Mumbai
-
-We look forward to serving you!
-
-Best regards,
-Mata Pita Da Dhaba Team
-        """
-        
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[customer.email],
-            fail_silently=False,
-        )
-        
-        logger.info(f"Customer confirmation email sent to {customer.email}")
-        return True
-        
-    except Exception as e:
-        logger.error(f"Failed to send customer email: {str(e)}")
-        return False
+    return render_email(
+        'email_reservation_customer',
+        subject='Reservation Confirmation - Mata Pita Da Dhaba',
+        to=[customer.email],
+        context={'reservation': reservation, 'customer': customer},
+    )
 
 
-def send_all_notifications(reservation, customer):
+def waitlist_promotion_email(reservation, customer):
+    """
+    Build the email telling a waitlisted customer that a table freed up
+    and they now have a reservation.
+
+    Args:
+        reservation: Reservation object created from the waitlist entry
+        customer: Customer object
+
+    Returns:
+        EmailMultiAlternatives: The unsent email
+    """
+    return render_email(
+        'email_waitlist_promotion',
+        subject='A Table Is Now Available - Mata Pita Da Dhaba',
+        to=[customer.email],
+        context={'reservation': reservation, 'customer': customer},
+    )
+
+
+def reservation_reminder_email(reservation, customer):
     """
-    Send all notifications (email to staff and customer).
-    
+    Build the reminder email sent to a customer ahead of their reservation.
+
     Args:
         reservation: Reservation object
         customer: Customer object
-    
+
     Returns:
-        dict: Status of each notification type
+        EmailMultiAlternatives: The unsent email
     """
-    results = {
-        'staff_email': False,
-        'customer_email': False,
-    }
-    
-    # Send email to staff
-    results['staff_email'] = send_reservation_email_to_staff(reservation, customer)
-    
-    # Send email to customer
-    results['customer_email'] = send_reservation_email_to_customer(reservation, customer)
-    
-    # Log summary
-    successful = sum(results.values())
-    logger.info(f"Notifications sent: {successful}/2 successful")
-    
+    return render_email(
+        'email_reservation_reminder',
+        subject='Reservation Reminder - Mata Pita Da Dhaba',
+        to=[customer.email],
+        context={'reservation': reservation, 'customer': customer},
+    )
+
+
+def staff_digest_email(reservations, recipient):
+    """
+    Build one email to a staff member listing new reservations.
+
+    Args:
+        reservations: Reservation objects, with customer loaded
+        recipient: Staff email address
+
+    Returns:
+        EmailMultiAlternatives: The unsent email
+    """
+    return render_email(
+        'email_staff_digest',
+        subject=f'{len(reservations)} New Reservations - Mata Pita Da Dhaba',
+        to=[recipient],
+        context={'reservations': reservations},
+    )
+
+
+def send_batch(messages):
+    """
+    Send messages over one pooled connection, so the batch pays for at most
+    one SMTP handshake. A failed message does not stop the rest.
+
+    Returns:
+        list: None for each message sent, or the exception it failed with
+    """
+    results = []
+    if not messages:
+        return results
+    started = time.perf_counter()
+    try:
+        with pool.connection() as pooled:
+            for message in messages:
+                try:
+                    pooled.backend.send_messages([message])
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+                    if not pooled.is_healthy(force=True):
+                        # The server dropped us; carry on over a fresh connection
+                        pooled.reopen()
+    except Exception as e:
+        # No connection to the server; the rest of the batch cannot go out
+        logger.error(f"Mail connection failed: {str(e)}")
+        results.extend([e] * (len(messages) - len(results)))
+
+    elapsed = (time.perf_counter() - started) * 1000
+    logger.info(f"Sent {results.count(None)}/{len(messages)} emails in {elapsed:.1f} ms")
     return results
+
+
+def send_all_notifications(reservation, customer):
+    """
+    Hand the staff and customer emails for a reservation to the in-process
+    dispatcher (see dispatcher.py) instead of sending them inline.
+
+    The emails are queued in the notification outbox in the caller's
+    transaction and handed to the dispatcher once it commits; when the
+    dispatcher is off or full, drain_notifications sends them.
+
+    Args:
+        reservation: Reservation object
+        customer: Customer object (the reservation's customer)
+    """
+    # Imported here: the outbox builds its emails with this module
+    from .outbox import queue_reservation_notifications
+    queue_reservation_notifications(reservation)
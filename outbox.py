@@ -0,0 +1,225 @@
+"""
+Transactional notification outbox.
+Emails are queued as NotificationOutbox rows in the transaction that
+creates the reservation. Once it commits they are handed to the
+in-process dispatcher (see dispatcher.py), and drain_notifications sends
+whatever is left in batches. Due rows are claimed (status 'sending') in
+one short transaction, sent outside it over one pooled connection, then
+marked sent, or rescheduled with exponential backoff and given up on
+after NOTIFICATION_MAX_ATTEMPTS. Delivery is at least once: a worker
+that dies after sending but before marking the row is retried after
+NOTIFICATION_CLAIM_TIMEOUT, so every email carries its idempotency key
+in an X-Idempotency-Key header.
+"""
+
+import datetime
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import NotificationOutbox
+from .dispatcher import dispatcher
+from .digest import digest_enabled, send_due_digests
+from .notifications import (
+    reservation_email_to_customer, reservation_email_to_staff, send_batch, waitlist_promotion_email,
+)
+
+logger = logging.getLogger(__name__)
+
+# Builds the email for each kind of outbox row from (reservation, customer)
+EMAIL_BUILDERS = {
+    NotificationOutbox.STAFF_RESERVATION: reservation_email_to_staff,
+    NotificationOutbox.CUSTOMER_RESERVATION: reservation_email_to_customer,
+    NotificationOutbox.WAITLIST_PROMOTION: waitlist_promotion_email,
+}
+
+
+def get_batch_size():
+    return getattr(settings, 'NOTIFICATION_BATCH_SIZE', 50)
+
+
+def retry_delay(attempts):
+    """
+    Seconds to wait before the next attempt, doubling after each failure.
+    """
+    base = getattr(settings, 'NOTIFICATION_RETRY_SECONDS', 60)
+    longest = getattr(settings, 'NOTIFICATION_RETRY_MAX_SECONDS', 3600)
+    return min(base * 2 ** max(attempts - 1, 0), longest)
+
+
+def outbox_row(kind, reservation):
+    return NotificationOutbox(idempotency_key=f'{kind}:{reservation.pk}', kind=kind, reservation=reservation)
+
+
+def queue_notifications(kind, reservations):
+    """
+    Queue one email of `kind` per reservation. Call inside the transaction
+    that saves the reservations; emails already queued are left alone.
+    """
+    queue_rows([outbox_row(kind, reservation) for reservation in reservations])
+
+
+def queue_reservation_notifications(reservation):
+    """
+    Queue the staff and customer emails for a new reservation. In digest
+    mode staff hear about it in the next digest instead.
+    """
+    kinds = [NotificationOutbox.CUSTOMER_RESERVATION]
+    if not digest_enabled():
+        kinds.append(NotificationOutbox.STAFF_RESERVATION)
+    queue_rows([outbox_row(kind, reservation) for kind in kinds])
+
+
+def queue_rows(rows):
+    NotificationOutbox.objects.bulk_create(rows, ignore_conflicts=True)
+    # Without a separate worker, send them from this process once committed
+    keys = [row.idempotency_key for row in rows]
+    transaction.on_commit(partial(dispatch, keys))
+
+
+def dispatch(keys):
+    """
+    Hand freshly queued emails to the in-process dispatcher. When it is
+    off or full they simply stay pending for the next dispatch or drain.
+    """
+    if not dispatcher.submit(send_dispatched, keys):
+        logger.info(f"{len(keys)} emails left in the outbox for drain_notifications")
+
+
+def send_dispatched(keys):
+    # Runs on a dispatcher thread: send these emails, then one batch of any
+    # others that are due (earlier retries, or ones a full queue left
+    # behind), and the staff digest when it is due
+    send_queued(keys)
+    drain(max_batches=1)
+    send_due_digests()
+
+
+def due_rows(now):
+    """
+    The rows that are due at `now`, oldest first: pending rows whose retry
+    time has come, and rows claimed by a worker that died mid-batch.
+    """
+    stale = now - datetime.timedelta(seconds=getattr(settings, 'NOTIFICATION_CLAIM_TIMEOUT', 600))
+    return NotificationOutbox.objects.filter(
+        Q(status=NotificationOutbox.PENDING, next_attempt_at__lte=now)
+        | Q(status=NotificationOutbox.SENDING, claimed_at__lt=stale)
+    ).order_by('next_attempt_at')
+
+
+def claim_batch(batch_size=None, keys=None):
+    """
+    Claim up to `batch_size` due rows for this worker, including rows whose
+    worker died mid-batch, or only the pending rows with the given
+    idempotency `keys`.
+
+    Returns:
+        list: The claimed NotificationOutbox rows, with reservation and customer loaded
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        if keys is not None:
+            due = NotificationOutbox.objects.filter(idempotency_key__in=keys, status=NotificationOutbox.PENDING)
+        else:
+            due = due_rows(now)[:batch_size or get_batch_size()]
+        ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True))
+        NotificationOutbox.objects.filter(pk__in=ids).update(
+            status=NotificationOutbox.SENDING, claimed_at=now, attempts=F('attempts') + 1
+        )
+    return list(
+        NotificationOutbox.objects.filter(pk__in=ids)
+        .select_related('reservation__customer')
+        .order_by('next_attempt_at')
+    )
+
+
+def build_message(row):
+    """
+    The email for one claimed row, tagged with its idempotency key.
+    """
+    reservation = row.reservation
+    message = EMAIL_BUILDERS[row.kind](reservation, reservation.customer)
+    message.extra_headers['X-Idempotency-Key'] = row.idempotency_key
+    return message
+
+
+def send_rows(rows):
+    """
+    Send the emails of claimed rows over one connection and record the
+    outcome of each: sent, retried later, or failed for good.
+
+    Returns:
+        dict: {'sent': count, 'retried': count, 'dead': count}
+    """
+    max_attempts = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+    counts = {'sent': 0, 'retried': 0, 'dead': 0}
+
+    deliverable = []
+    for row in rows:
+        if row.reservation is None:
+            # Cancelled before we got to it; nothing to announce
+            mark_dead(row, 'The reservation was deleted before the email was sent')
+            counts['dead'] += 1
+        else:
+            deliverable.append(row)
+
+    sent = []
+    errors = send_batch([build_message(row) for row in deliverable])
+    for row, error in zip(deliverable, errors):
+        if error is None:
+            sent.append(row.pk)
+        elif row.attempts >= max_attempts:
+            mark_dead(row, str(error))
+            counts['dead'] += 1
+        else:
+            delay = retry_delay(row.attempts)
+            NotificationOutbox.objects.filter(pk=row.pk).update(
+                status=NotificationOutbox.PENDING,
+                next_attempt_at=timezone.now() + datetime.timedelta(seconds=delay),
+                last_error=str(error),
+            )
+            counts['retried'] += 1
+            logger.warning(f"Notification {row.idempotency_key} failed, retrying in {delay}s: {str(error)}")
+
+    NotificationOutbox.objects.filter(pk__in=sent).update(
+        status=NotificationOutbox.SENT, sent_at=timezone.now(), last_error=''
+    )
+    counts['sent'] = len(sent)
+    return counts
+
+
+def send_queued(keys):
+    """
+    Send the pending emails with the given idempotency keys right away.
+    Emails another worker already claimed are left to it.
+    """
+    return send_rows(claim_batch(keys=keys))
+
+
+def drain(batch_size=None, max_batches=None):
+    """
+    Send due emails batch after batch until none are left (or max_batches
+    batches were sent).
+
+    Returns:
+        dict: {'sent': count, 'retried': count, 'dead': count}
+    """
+    counts = {'sent': 0, 'retried': 0, 'dead': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(batch_size)
+        if not rows:
+            break
+        batches += 1
+        for outcome, count in send_rows(rows).items():
+            counts[outcome] += count
+    return counts
+
+
+def mark_dead(row, error):
+    NotificationOutbox.objects.filter(pk=row.pk).update(status=NotificationOutbox.DEAD, last_error=error)
+    logger.error(f"Notification {row.idempotency_key} gave up after {row.attempts} attempts: {error}")
@@ -1,42 +1,117 @@
-from django.core.management.base import BaseCommand
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from restaurant.models import MenuItem
+from restaurant.menu_cache import bump_menu_version
 
 
 class Command(BaseCommand):
     help = 'Populate menu items from the restaurant menu card'
 
-    def handle(self, *args, **kwargs):
+    # Fields compared and written for rows matched by (name, category)
+    SYNC_FIELDS = ('description', 'sub_category', 'sizes_and_prices', 'available')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from-json',
+            metavar='PATH',
+            help='Load menu items from a JSON file (a list of item dicts) instead of the built-in menu card',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing to the database',
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete menu items that are no longer in the source data',
+        )
+
+    def handle(self, *args, **options):
         self.stdout.write('Populating menu items...')
-        
-        # Clear existing menu items (optional - comment out if you want to keep existing items)
-        # MenuItem.objects.all().delete()
-        
-        menu_data = self.get_menu_data()
-        
-        created_count = 0
-        updated_count = 0
-        
+        started = time.perf_counter()
+
+        menu_data = self.load_menu_data(options['from_json'])
+
+        # Later entries win when the source repeats a (name, category) pair
+        source = {}
         for item_data in menu_data:
-            item, created = MenuItem.objects.update_or_create(
-                name=item_data['name'],
-                category=item_data['category'],
-                defaults={
-                    'description': item_data.get('description', ''),
-                    'sub_category': item_data.get('sub_category'),
-                    'sizes_and_prices': item_data['sizes_and_prices'],
-                    'available': item_data.get('available', True),
-                }
-            )
-            if created:
-                created_count += 1
+            source[(item_data['name'], item_data['category'])] = {
+                'description': item_data.get('description', ''),
+                'sub_category': item_data.get('sub_category'),
+                'sizes_and_prices': item_data['sizes_and_prices'],
+                'available': item_data.get('available', True),
+            }
+
+        # One query for everything already in the database
+        existing = {}
+        stale = []
+        for item in MenuItem.objects.order_by('id'):
+            key = (item.name, item.category)
+            if key in existing:
+                # Duplicate rows for the same dish are left over from older seeds
+                stale.append(item)
             else:
-                updated_count += 1
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Successfully populated menu! Created: {created_count}, Updated: {updated_count}'
-            )
+                existing[key] = item
+
+        to_create = []
+        to_update = []
+        unchanged_count = 0
+        for key, values in source.items():
+            item = existing.get(key)
+            if item is None:
+                to_create.append(MenuItem(name=key[0], category=key[1], **values))
+                continue
+            if all(getattr(item, field) == values[field] for field in self.SYNC_FIELDS):
+                unchanged_count += 1
+                continue
+            for field, value in values.items():
+                setattr(item, field, value)
+            to_update.append(item)
+
+        to_delete = []
+        if options['prune']:
+            to_delete = stale + [item for key, item in existing.items() if key not in source]
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                MenuItem.objects.bulk_create(to_create, batch_size=500)
+                MenuItem.objects.bulk_update(to_update, self.SYNC_FIELDS, batch_size=500)
+                if to_delete:
+                    MenuItem.objects.filter(pk__in=[item.pk for item in to_delete]).delete()
+                if to_create or to_update or to_delete:
+                    # Bulk writes skip the save signals, so invalidate the menu once here
+                    transaction.on_commit(bump_menu_version)
+
+        elapsed = time.perf_counter() - started
+        summary = (
+            f'Created: {len(to_create)}, Updated: {len(to_update)}, '
+            f'Unchanged: {unchanged_count}, Deleted: {len(to_delete)} '
+            f'({elapsed * 1000:.0f} ms)'
         )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing written. {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully populated menu! {summary}'))
+
+    def load_menu_data(self, json_path):
+        """Returns menu items from a JSON file, or the built-in menu card"""
+        if not json_path:
+            return self.get_menu_data()
+        try:
+            with open(json_path, encoding='utf-8') as json_file:
+                menu_data = json.load(json_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read menu data from {json_path}: {e}')
+        if not isinstance(menu_data, list):
+            raise CommandError(f'{json_path} must contain a JSON list of menu items')
+        for index, item_data in enumerate(menu_data):
+            if not isinstance(item_data, dict) or not {'name', 'category', 'sizes_and_prices'} <= item_data.keys():
+                raise CommandError(f'Item {index} in {json_path} needs name, category and sizes_and_prices')
+        return menu_data
 
     def get_menu_data(self):
         """Returns all menu items from the menu card"""
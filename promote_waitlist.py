@@ -0,0 +1,28 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from restaurant.waitlist import promote_waitlist
+
+
+class Command(BaseCommand):
+    help = 'Turn waitlisted parties into reservations where seats are free'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Only promote parties waiting for this day, as YYYY-MM-DD (default: every day from today)',
+        )
+
+    def handle(self, *args, **options):
+        date = None
+        if options['date']:
+            try:
+                date = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+
+        counts = promote_waitlist(date)
+        self.stdout.write(self.style.SUCCESS(
+            f"Waitlist promoted. Promoted: {counts['promoted']}, Expired: {counts['expired']} "
+            f"(promotion emails are queued for drain_notifications)"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from restaurant.capacity import reconcile_slots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ReservationSlot capacity ledger from the Reservation table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without writing to the database',
+        )
+
+    def handle(self, *args, **options):
+        counts = reconcile_slots(dry_run=options['dry_run'])
+        summary = (
+            f"Created: {counts['created']}, Corrected: {counts['corrected']}, "
+            f"Unchanged: {counts['unchanged']}"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing written. {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Slot ledger reconciled. {summary}'))
@@ -0,0 +1,92 @@
+"""
+Template tags for responsive images built by build_responsive_images.
+
+    {% load responsive_images %}
+    {% responsive_image 'dal-makhani' alt='Dal Makhani' sizes='(min-width: 768px) 33vw, 100vw' class='w-full' %}
+    style="background-image: url('{% responsive_image_url 'hero' 1920 %}')"
+"""
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from restaurant.image_pipeline import load_manifest, image_url
+
+register = template.Library()
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+def _original_url(name, width):
+    """
+    Before the first build, fall back to the configured source if it is a
+    URL. Image CDN sources (a ?w= parameter, as on Unsplash) are asked for
+    `width` pixels rather than the full-size original.
+    """
+    source = str(getattr(settings, 'RESPONSIVE_IMAGES', {}).get(name, ''))
+    if not source.startswith(('http://', 'https://')):
+        return ''
+    parts = urlsplit(source)
+    query = dict(parse_qsl(parts.query))
+    if 'w' not in query:
+        return source
+    query['w'] = str(width)
+    if 'q' in query:
+        # The quality the page hot-linked before the pipeline existed
+        query['q'] = '80'
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _srcset(variants):
+    return ', '.join(f"{image_url(variant['path'])} {variant['width']}w" for variant in variants)
+
+
+@register.simple_tag
+def responsive_image(name, alt='', sizes='100vw', loading='lazy', fallback_width=800, **attrs):
+    """
+    Render a <picture> with one srcset per format (AVIF first), falling back
+    to a plain <img> of the original image, `fallback_width` pixels wide,
+    if no derivatives exist yet.
+    """
+    extra_attrs = format_html_join('', ' {}="{}"', attrs.items())
+    entry = load_manifest().get(name)
+    if not entry:
+        return format_html(
+            '<img src="{}" alt="{}" loading="{}" decoding="async"{}>',
+            _original_url(name, fallback_width), alt, loading, extra_attrs,
+        )
+
+    by_format = {}
+    for variant in entry['variants']:
+        by_format.setdefault(variant['format'], []).append(variant)
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], _srcset(by_format[fmt]), sizes) for fmt in MIME_TYPES if fmt in by_format),
+    )
+    # The <img> fallback uses the last format (WebP where available)
+    fallback = by_format[list(by_format)[-1]]
+    default = fallback[len(fallback) // 2]
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" '
+        'loading="{}" decoding="async"{}></picture>',
+        sources, image_url(default['path']), _srcset(fallback), sizes,
+        entry['width'], entry['height'], alt, loading, extra_attrs,
+    )
+
+
+@register.simple_tag
+def responsive_image_url(name, width=1200, fmt='webp'):
+    """
+    URL of the smallest derivative at least `width` pixels wide,
+    for places that cannot use srcset such as CSS backgrounds.
+    """
+    entry = load_manifest().get(name)
+    if not entry:
+        return _original_url(name, width)
+    variants = [variant for variant in entry['variants'] if variant['format'] == fmt] or entry['variants']
+    wide_enough = [variant for variant in variants if variant['width'] >= int(width)]
+    chosen = min(wide_enough, key=lambda v: v['width']) if wide_enough else max(variants, key=lambda v: v['width'])
+    return image_url(chosen['path'])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from restaurant.digest import digest_enabled, send_due_digests
+
+
+class Command(BaseCommand):
+    help = 'Email staff the digest of new unconfirmed reservations when it is due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Send now, even if the last digest is younger than STAFF_DIGEST_MINUTES',
+        )
+
+    def handle(self, *args, **options):
+        if not digest_enabled():
+            self.stdout.write(self.style.WARNING('Digest mode is off (STAFF_DIGEST_MINUTES = 0); staff get one email per booking.'))
+            return
+        sent = send_due_digests(force=options['force'])
+        self.stdout.write(self.style.SUCCESS(f'Staff digests sent: {sent}'))
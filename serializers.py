@@ -1,7 +1,19 @@
 from rest_framework import serializers
 from .models import MenuItem, Customer, Reservation
+from .capacity import NoTableAvailable, SlotFull, admit_reservation, booking_transaction, snap_to_slot
 import datetime
-class MenuItemSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that takes an optional `fields` argument listing
+    which fields to include (sparse fieldsets).
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+class MenuItemSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = MenuItem
         fields = '__all__'
@@ -9,28 +21,39 @@ class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
+        # Returning guests book again under their email; Customer.objects.upsert
+        # finds them instead of rejecting the email as taken
+        extra_kwargs = {'email': {'validators': []}}
 class ReservationSerializer(serializers.ModelSerializer):
     customer = CustomerSerializer()
     class Meta:
         model = Reservation
         fields = '__all__'
+        # Tables are assigned by admit_reservation, never by the client
+        read_only_fields = ('tables',)
+    def validate_time(self, value):
+        # Book on the slot grid, like the reservation form does
+        return snap_to_slot(value)
     def validate(self, data):
-        # basic field validation
-        if data['date'] < datetime.date.today():
+        # basic field validation; partial updates fall back to the saved values
+        date = data.get('date', getattr(self.instance, 'date', None))
+        guests = data.get('guests', getattr(self.instance, 'guests', None))
+        if date is not None and date < datetime.date.today():
             raise serializers.ValidationError({'date':'Reservation date must be today or in the future.'})
-        if data['party_size'] < 1:
-            raise serializers.ValidationError({'party_size':'Party size must be at least 1.'})
-        # check for exact datetime collision (same date and time)
-        date = data.get('date')
-        time = data.get('time')
-        qs = Reservation.objects.filter(date=date, time=time)
-        if self.instance:
-            qs = qs.exclude(pk=self.instance.pk)
-        if qs.exists():
-            raise serializers.ValidationError({'non_field_errors':'A reservation already exists at this date and time. Please choose another slot.'})
+        if guests is not None and guests < 1:
+            raise serializers.ValidationError({'guests':'Party size must be at least 1.'})
+        # Several parties can share a slot; admit_reservation checks the seats
         return data
     def create(self, validated_data):
         cust_data = validated_data.pop('customer')
-        customer, _ = Customer.objects.get_or_create(email=cust_data.get('email'), defaults=cust_data)
-        reservation = Reservation.objects.create(customer=customer, **validated_data)
+        try:
+            with booking_transaction():
+                customer = Customer.objects.upsert(
+                    email=cust_data['email'], name=cust_data['name'], phone=cust_data.get('phone', '')
+                )
+                reservation = admit_reservation(Reservation(customer=customer, **validated_data))
+        except NoTableAvailable:
+            raise serializers.ValidationError({'non_field_errors': f"No table is free for a party of {validated_data['guests']} at this time."})
+        except SlotFull as full:
+            raise serializers.ValidationError({'non_field_errors': f'Only {full.remaining_capacity} seats remaining for this time slot.'})
         return reservation
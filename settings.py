@@ -58,6 +58,27 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Seconds a write waits for SQLite's write lock, e.g. while a
+            # booking holds it (see capacity.booking_transaction)
+            'timeout': 20,
+        },
+        # manage.py test: file-backed, so the concurrency tests get one real
+        # connection per thread, like production
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+# Menu and availability caches. Version bumps use cache.incr(), so with
+# several worker processes point this at a shared cache (e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# CACHE_LOCATION=redis://127.0.0.1:6379); the default local-memory cache
+# is per process.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 AUTH_PASSWORD_VALIDATORS = []
@@ -70,6 +91,86 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOW_ALL_ORIGINS = True
 
+# Menu page: render only the first N categories inline and load the rest as
+# fragments while scrolling. 0 renders the whole menu in one response.
+MENU_EAGER_CATEGORIES = int(os.getenv('MENU_EAGER_CATEGORIES', '0'))
+
+# Precompiled menu artifacts (python manage.py build_menu_artifacts).
+# Serve MENU_ARTIFACT_ROOT at MENU_ARTIFACT_URL straight from the web server,
+# with far-future cache headers for everything except manifest.json.
+MENU_ARTIFACT_ROOT = BASE_DIR / 'menu_artifacts'
+MENU_ARTIFACT_URL = '/menu-artifacts/'
+# Rebuild the artifacts automatically whenever the menu changes
+MENU_ARTIFACTS_AUTO_BUILD = os.getenv('MENU_ARTIFACTS_AUTO_BUILD', 'False') == 'True'
+
+# Responsive images (python manage.py build_responsive_images).
+# Derivatives are written under static/ and served as static files.
+RESPONSIVE_IMAGE_ROOT = BASE_DIR / 'static' / 'img' / 'responsive'
+RESPONSIVE_IMAGE_STATIC_PREFIX = 'img/responsive/'
+RESPONSIVE_IMAGE_WIDTHS = [480, 800, 1200, 1920]
+RESPONSIVE_IMAGE_FORMATS = ['avif', 'webp']
+# name -> local path or remote URL (remote images are downloaded once and cached)
+RESPONSIVE_IMAGES = {
+    'hero': 'https://images.unsplash.com/photo-1517248135467-4c7edcad34c4?w=2400&q=85',
+    'dal-makhani': 'https://images.unsplash.com/photo-1546833999-b9f581a1996d?w=1600&q=85',
+    'paneer-tikka': 'https://images.unsplash.com/photo-1567188040759-fb8a883dc6d8?w=1600&q=85',
+    'biryani': 'https://images.unsplash.com/photo-1589302168068-964664d93dc0?w=1600&q=85',
+    'menu-card': BASE_DIR / 'static' / 'images' / 'menu.webp',
+    'dhaba': BASE_DIR / 'static' / 'images' / 'download.jpeg',
+    'background': BASE_DIR / 'static' / 'images' / 'background image',
+}
+
+# Reservations: bookable start times run every RESERVATION_SLOT_MINUTES from
+# each service's first to its last seating (24h HH:MM). Services, seats and
+# seating length are CapacityRule rows in the admin; the opening hours,
+# capacity and seating length below apply on days without any rule.
+# The availability API returns at most RESERVATION_GRID_MAX_DAYS days and
+# may be cached by browsers for RESERVATION_AVAILABILITY_MAX_AGE seconds.
+RESERVATION_OPENING_HOURS = ('11:00', '22:30')
+RESERVATION_DEFAULT_CAPACITY = 45
+RESERVATION_SEATING_MINUTES = 90
+# Reservation times are snapped to this grid (from midnight) in the form,
+# the API and the admin; run snap_reservation_times after changing it
+RESERVATION_SLOT_MINUTES = 15
+RESERVATION_GRID_MAX_DAYS = 14
+RESERVATION_AVAILABILITY_MAX_AGE = 30
+# When a slot is full, suggest this many nearest free start times on the
+# same day and up to RESERVATION_SUGGESTION_DAYS days either side
+RESERVATION_SUGGESTIONS = 3
+RESERVATION_SUGGESTION_DAYS = 1
+# Cached availability is refreshed on every reservation change; the timeout
+# only bounds staleness when the cache is not shared between processes
+AVAILABILITY_CACHE_TIMEOUT = 300
+
+# Waitlist: seats freed by cancelled or edited reservations are offered to
+# waiting parties straight away; promote_waitlist also does it on a schedule
+WAITLIST_AUTO_PROMOTE = True
+
+# Notification outbox: drain_notifications sends NOTIFICATION_BATCH_SIZE
+# emails per batch. A failed email is retried after NOTIFICATION_RETRY_SECONDS,
+# doubling up to NOTIFICATION_RETRY_MAX_SECONDS, and given up on after
+# NOTIFICATION_MAX_ATTEMPTS. Rows a crashed worker claimed are retried after
+# NOTIFICATION_CLAIM_TIMEOUT seconds.
+NOTIFICATION_BATCH_SIZE = 50
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_SECONDS = 60
+NOTIFICATION_RETRY_MAX_SECONDS = 3600
+NOTIFICATION_CLAIM_TIMEOUT = 600
+# Without a drain_notifications worker, queued emails are sent by
+# NOTIFICATION_DISPATCH_THREADS threads in the web process (0 turns this
+# off); at most NOTIFICATION_DISPATCH_QUEUE sends wait, the rest stay in
+# the outbox for the next dispatch or drain
+NOTIFICATION_DISPATCH_THREADS = 2
+NOTIFICATION_DISPATCH_QUEUE = 50
+# Staff digest: with STAFF_DIGEST_MINUTES > 0, staff get one email every
+# that many minutes listing new unconfirmed reservations (at most
+# STAFF_DIGEST_MAX_RESERVATIONS per email) instead of one per booking.
+# Empty STAFF_DIGEST_RECIPIENTS means MANAGER_EMAIL. Sent by
+# drain_notifications, the dispatcher or send_staff_digest
+STAFF_DIGEST_MINUTES = 0
+STAFF_DIGEST_RECIPIENTS = []
+STAFF_DIGEST_MAX_RESERVATIONS = 50
+
 # Email Configuration (Gmail SMTP)
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -78,6 +179,15 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.getenv('EMAIL_HOST_USER')
+# Open SMTP connections are reused between batches: at most EMAIL_POOL_SIZE
+# stay open per process, one idle for EMAIL_POOL_CHECK_AFTER seconds is
+# checked with NOOP before reuse, and one older than EMAIL_POOL_MAX_AGE
+# seconds is replaced
+EMAIL_POOL_SIZE = 2
+EMAIL_POOL_CHECK_AFTER = 30
+EMAIL_POOL_MAX_AGE = 300
+# Socket timeout for each SMTP operation, in seconds
+EMAIL_TIMEOUT = 10
 
 # Notification Recipients
 MANAGER_EMAIL = os.getenv('MANAGER_EMAIL', 'siddhantjagtap0707@gmail.com')
@@ -0,0 +1,157 @@
+"""
+Signal handlers that keep cached data in sync with the database.
+"""
+
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CapacityRule, MenuItem, Reservation, ReservationSlot
+from .capacity import adjust_booked_guests
+from .menu_cache import bump_menu_version, menu_changed
+from .availability_cache import bump_availability, invalidate_capacity_rules
+from .menu_artifacts import build_menu_artifacts
+from .waitlist import promote_waitlist
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_menu_snapshot(sender, **kwargs):
+    """
+    Bump the menu version once the change is committed, so a new snapshot
+    is never built from data that is not visible yet.
+    """
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver(menu_changed)
+def rebuild_menu_artifacts(sender, **kwargs):
+    """
+    Rebuild the static menu artifacts after a menu change, when enabled.
+    A failed build must never break the save that triggered it.
+    """
+    if not getattr(settings, 'MENU_ARTIFACTS_AUTO_BUILD', False):
+        return
+    try:
+        build_menu_artifacts()
+    except Exception as e:
+        logger.error(f"Failed to build menu artifacts: {str(e)}")
+
+
+# Fields that decide which slot a reservation occupies and how many seats
+LEDGER_FIELDS = ('date', 'time', 'guests')
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_reserved_seats(sender, instance, update_fields=None, **kwargs):
+    """
+    Before an edit, load the slot and guest count the reservation held,
+    so post_save can move the seats in the slot ledger.
+    """
+    instance._previous_seats = None
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(LEDGER_FIELDS):
+        return
+    instance._previous_seats = (
+        Reservation.objects.filter(pk=instance.pk).values_list(*LEDGER_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Reservation)
+def update_slot_ledger_on_save(sender, instance, created, **kwargs):
+    """
+    Keep ReservationSlot.booked_guests in step with new and edited reservations.
+    """
+    # Every save counts, including admin list_editable confirmations
+    invalidate_availability(instance.date)
+    if created:
+        # admit_reservation() claims the seats itself before saving
+        if not getattr(instance, '_seats_claimed', False):
+            adjust_booked_guests(instance.date, instance.time, instance.guests)
+        return
+
+    previous = getattr(instance, '_previous_seats', None)
+    if previous is None:
+        return
+    previous_date, previous_time, previous_guests = previous
+    if (previous_date, previous_time) == (instance.date, instance.time):
+        adjust_booked_guests(instance.date, instance.time, instance.guests - previous_guests)
+    else:
+        adjust_booked_guests(previous_date, previous_time, -previous_guests)
+        adjust_booked_guests(instance.date, instance.time, instance.guests)
+        if previous_date != instance.date:
+            invalidate_availability(previous_date)
+
+
+@receiver(post_delete, sender=Reservation)
+def update_slot_ledger_on_delete(sender, instance, **kwargs):
+    adjust_booked_guests(instance.date, instance.time, -instance.guests)
+    invalidate_availability(instance.date)
+
+
+@receiver(post_delete, sender=Reservation)
+def promote_waitlist_on_delete(sender, instance, **kwargs):
+    schedule_waitlist_promotion(instance.date)
+
+
+@receiver(post_save, sender=Reservation)
+def promote_waitlist_on_edit(sender, instance, created, **kwargs):
+    """
+    A reservation moved to another slot or made smaller frees seats in
+    the slot it held.
+    """
+    previous = getattr(instance, '_previous_seats', None)
+    if created or previous is None or previous == (instance.date, instance.time, instance.guests):
+        return
+    schedule_waitlist_promotion(previous[0])
+
+
+def schedule_waitlist_promotion(date):
+    """
+    Offer freed seats to the waitlist once the change is committed.
+    """
+    if getattr(settings, 'WAITLIST_AUTO_PROMOTE', True):
+        transaction.on_commit(partial(promote_waitlist_safely, date))
+
+
+def promote_waitlist_safely(date):
+    # Promotion must never break the change that freed the seats
+    try:
+        promote_waitlist(date)
+    except Exception as e:
+        logger.error(f"Failed to promote the waitlist for {date}: {str(e)}")
+
+
+@receiver(post_save, sender=ReservationSlot)
+@receiver(post_delete, sender=ReservationSlot)
+def invalidate_slot_availability(sender, instance, **kwargs):
+    """
+    Ledger rows edited or deleted in the admin change availability without
+    touching a Reservation.
+    """
+    invalidate_availability(instance.date)
+
+
+@receiver(post_save, sender=CapacityRule)
+@receiver(post_delete, sender=CapacityRule)
+def invalidate_rules(sender, **kwargs):
+    """
+    Drop the cached rules once a rule change is committed. Cached bookings
+    stay valid; availability is recomputed from them with the new rules.
+    """
+    transaction.on_commit(invalidate_capacity_rules)
+
+
+def invalidate_availability(date):
+    """
+    Refresh the cached availability of a day once the change is committed,
+    so other processes never cache figures from before it.
+    """
+    transaction.on_commit(partial(bump_availability, date))
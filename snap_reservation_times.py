@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from restaurant.capacity import get_slot_minutes, snap_reservation_times
+
+
+class Command(BaseCommand):
+    help = 'Move reservations onto the slot grid (run after changing RESERVATION_SLOT_MINUTES)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many reservations would move without writing to the database',
+        )
+
+    def handle(self, *args, **options):
+        moved = snap_reservation_times(dry_run=options['dry_run'])
+        summary = f"{moved} reservation(s) off the {get_slot_minutes()} minute grid"
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run, nothing written. {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Reservation times snapped. {summary}'))
@@ -0,0 +1,121 @@
+"""
+Table allocation for reservations.
+Seats each party at one table, or at tables of the same combine group pushed
+together, so the restaurant never accepts a party no real table layout can
+seat. Works in memory on (begin, end) windows in minutes from midnight:
+options are tried smallest first (best fit), and each table keeps its busy
+windows in sorted lists checked with bisect, so a full day of bookings is
+allocated in milliseconds.
+"""
+
+from bisect import bisect_left, bisect_right
+from itertools import combinations
+
+# Most tables pushed together for one party
+MAX_COMBINED_TABLES = 3
+
+
+def table_options(tables):
+    """
+    Every way to seat a party: each table alone, plus combinations of up to
+    MAX_COMBINED_TABLES tables from the same combine group.
+
+    Args:
+        tables: Iterable of (table_id, seats, combine_group) tuples
+
+    Returns:
+        list: (seats, table_ids) tuples, fewest seats first, then fewest tables
+    """
+    options = []
+    groups = {}
+    for table_id, seats, group in tables:
+        options.append((seats, (table_id,)))
+        if group:
+            groups.setdefault(group, []).append((table_id, seats))
+
+    for group_tables in groups.values():
+        for size in range(2, min(MAX_COMBINED_TABLES, len(group_tables)) + 1):
+            for combo in combinations(group_tables, size):
+                options.append((sum(seats for _, seats in combo), tuple(table_id for table_id, _ in combo)))
+
+    options.sort(key=lambda option: (option[0], len(option[1]), option[1]))
+    return options
+
+
+class TablePlan:
+    """
+    Busy windows per table for one day, and the table options to pick from.
+    """
+
+    def __init__(self, tables):
+        tables = list(tables)
+        self.options = table_options(tables)
+        self._option_seats = [seats for seats, _ in self.options]
+        # Per table, the begins and ends of its bookings; they never overlap,
+        # so both lists stay sorted
+        self._begins = {table_id: [] for table_id, _, _ in tables}
+        self._ends = {table_id: [] for table_id, _, _ in tables}
+
+    def _table_is_free(self, table_id, begin, end):
+        begins = self._begins.get(table_id)
+        if begins is None:
+            # Not an active table
+            return False
+        index = bisect_right(begins, begin)
+        if index > 0 and self._ends[table_id][index - 1] > begin:
+            return False
+        return index == len(begins) or begins[index] >= end
+
+    def is_free(self, table_ids, begin, end):
+        return all(self._table_is_free(table_id, begin, end) for table_id in table_ids)
+
+    def book(self, table_ids, begin, end):
+        for table_id in table_ids:
+            if table_id not in self._begins:
+                continue
+            index = bisect_left(self._begins[table_id], begin)
+            self._begins[table_id].insert(index, begin)
+            self._ends[table_id].insert(index, end)
+
+    def find(self, guests, begin, end):
+        """
+        The smallest free option that seats `guests` in [begin, end),
+        or None.
+        """
+        start = bisect_left(self._option_seats, guests)
+        # Tables recur across many options; check each one only once
+        free = {}
+        for _, table_ids in self.options[start:]:
+            for table_id in table_ids:
+                if table_id not in free:
+                    free[table_id] = self._table_is_free(table_id, begin, end)
+                if not free[table_id]:
+                    break
+            else:
+                return table_ids
+        return None
+
+
+def allocate(bookings, tables):
+    """
+    Seat a whole day of bookings from scratch, earliest first and larger
+    parties first among bookings that start together.
+
+    Args:
+        bookings: Iterable of (key, begin, end, guests) tuples
+        tables: Iterable of (table_id, seats, combine_group) tuples
+
+    Returns:
+        tuple: ({key: table_ids}, [keys that could not be seated])
+    """
+    plan = TablePlan(tables)
+    assignments = {}
+    unseated = []
+    for key, begin, end, guests in sorted(bookings, key=lambda booking: (booking[1], -booking[3])):
+        table_ids = plan.find(guests, begin, end)
+        if table_ids is None:
+            unseated.append(key)
+            continue
+        plan.book(table_ids, begin, end)
+        assignments[key] = table_ids
+    return assignments, unseated
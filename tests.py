@@ -0,0 +1,743 @@
+import datetime
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock, skipUnless
+
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    CapacityRule, Customer, MenuItem, NotificationOutbox, Reservation, ReservationSlot, StaffDigest, Waitlist,
+)
+from .capacity import (
+    SlotFull, admit_reservation, get_availability_grid, get_default_rule, get_remaining_capacity,
+    lock_overlapping_slots, reconcile_slots, rules_for_date,
+)
+from .menu_cache import MENU_PAGE_KEY, MENU_SNAPSHOT_KEY, build_menu_snapshot, get_eager_categories, get_menu_version
+from .menu_search import search_menu_items
+from .digest import send_due_digests
+from .dispatcher import NotificationDispatcher, dispatcher
+from .notifications import send_all_notifications
+from .outbox import drain, due_rows, queue_reservation_notifications
+
+
+class MenuPageCacheTests(TestCase):
+    """
+    The menu page is rendered once per menu version and revalidated with
+    ETag / Last-Modified.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.add_item('Tomato Soup')
+
+    def add_item(self, name):
+        # The menu version is bumped on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(name=name, category='soups', sizes_and_prices=[{'size': 'Bowl', 'price': 90}])
+
+    def test_conditional_get_is_answered_with_304(self):
+        response = self.client.get(reverse('menu'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        revalidated = self.client.get(reverse('menu'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_gzip_is_a_separate_representation(self):
+        plain = self.client.get(reverse('menu'))
+        gzipped = self.client.get(reverse('menu'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertNotEqual(gzipped['ETag'], plain['ETag'])
+        # A plain copy does not revalidate the gzipped one
+        response = self.client.get(reverse('menu'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_gzip_refused_with_q_0(self):
+        for header in ('gzip;q=0', 'identity, *;q=0', 'br, gzip; q=0'):
+            with self.subTest(header=header):
+                response = self.client.get(reverse('menu'), HTTP_ACCEPT_ENCODING=header)
+                self.assertNotIn('Content-Encoding', response)
+                self.assertFalse(response['ETag'].endswith('-gzip"'))
+        # Any weight above 0 accepts it
+        response = self.client.get(reverse('menu'), HTTP_ACCEPT_ENCODING='br;q=1.0, gzip;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_menu_change_invalidates_the_page(self):
+        response = self.client.get(reverse('menu'))
+        self.add_item('Sweet Corn Soup')
+
+        changed = self.client.get(reverse('menu'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertContains(changed, 'Sweet Corn Soup')
+
+    def test_menu_change_evicts_the_old_page(self):
+        self.client.get(reverse('menu'))
+        version = get_menu_version()
+        page_key = MENU_PAGE_KEY.format(version=version, eager=get_eager_categories())
+        self.assertIsNotNone(cache.get(page_key))
+        self.add_item('Sweet Corn Soup')
+        self.assertIsNone(cache.get(page_key))
+        self.assertIsNone(cache.get(MENU_SNAPSHOT_KEY.format(version=version)))
+
+    def test_etag_matches_the_version_rendered(self):
+        # The menu changes after condition() computed its ETag but before
+        # the page is rendered: the response carries the rendered version
+        version = get_menu_version()
+        self.add_item('Sweet Corn Soup')
+        new_version = get_menu_version()
+        with mock.patch('restaurant.views.get_menu_version', side_effect=[version, new_version]):
+            response = self.client.get(reverse('menu'))
+        self.assertEqual(response['ETag'], f'"menu-{new_version}"')
+        self.assertContains(response, 'Sweet Corn Soup')
+
+
+# Small configuration tables that are read whole on purpose (and cached)
+FULL_READ_TABLES = {'restaurant_capacityrule'}
+
+
+def is_table_scan(detail):
+    # "SCAN restaurant_menuitem" reads the whole table. Walking an index in
+    # order ("SCAN ... USING INDEX", e.g. the partial available-items index)
+    # and FTS5 lookups ("SCAN ... VIRTUAL TABLE INDEX") are fine
+    if not detail.startswith('SCAN ') or 'USING' in detail or 'VIRTUAL TABLE' in detail:
+        return False
+    return detail.split()[1] not in FULL_READ_TABLES
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite only')
+class QueryPlanTests(TestCase):
+    """
+    No hot query on the menu or reservation paths falls back to a full
+    table scan. Add a test here for every new hot query.
+    """
+    date = datetime.date(2025, 11, 25)
+    time = datetime.time(19, 0)
+
+    def setUp(self):
+        # Run the queries, not the cache lookups in front of them
+        cache.clear()
+
+    def assertNoTableScan(self, run_query):
+        with CaptureQueriesContext(connection) as captured:
+            run_query()
+        selects = [query['sql'] for query in captured.captured_queries if query['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertTrue(selects, 'No SELECT was run')
+        for sql in selects:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                scans = [row[-1] for row in cursor.fetchall() if is_table_scan(row[-1])]
+            self.assertEqual(scans, [], sql)
+
+    def test_menu_snapshot(self):
+        self.assertNoTableScan(build_menu_snapshot)
+
+    def test_menu_search(self):
+        self.assertNoTableScan(lambda: search_menu_items('paneer tik'))
+
+    def test_slot_capacity(self):
+        # check_availability and reservation_view
+        self.assertNoTableScan(lambda: get_remaining_capacity(self.date, self.time))
+
+    def test_slot_ledger_of_the_day(self):
+        # The seating sweep in admit_reservation
+        self.assertNoTableScan(
+            lambda: list(ReservationSlot.objects.filter(date=self.date).values_list('time', 'booked_guests'))
+        )
+
+    def test_availability_grid(self):
+        self.assertNoTableScan(lambda: get_availability_grid(self.date, 7))
+
+    def test_available_items_in_a_category(self):
+        # The menu API and the admin
+        self.assertNoTableScan(lambda: list(MenuItem.objects.filter(available=True, category='soups')))
+
+    def test_admin_menu_changelist_by_category(self):
+        self.assertNoTableScan(
+            lambda: list(MenuItem.objects.filter(category='soups').order_by('category', 'sub_category', 'name'))
+        )
+
+    def test_admin_unconfirmed_reservations(self):
+        self.assertNoTableScan(lambda: list(Reservation.objects.filter(confirmed=False, date__gte=self.date)))
+
+    def test_admin_reservations_on_a_date(self):
+        self.assertNoTableScan(lambda: list(Reservation.objects.filter(date=self.date)))
+
+    def test_waiting_parties_for_a_slot(self):
+        # Waitlist promotion
+        self.assertNoTableScan(lambda: list(
+            Waitlist.objects.filter(status=Waitlist.WAITING, date=self.date, time=self.time).order_by('created_at')
+        ))
+
+    def test_due_emails_to_claim(self):
+        # drain_notifications and the dispatcher
+        self.assertNoTableScan(lambda: list(due_rows(timezone.now())[:50].values_list('pk', flat=True)))
+
+    def test_staff_digest_reservations(self):
+        # The next unconfirmed reservations above a digest watermark
+        self.assertNoTableScan(lambda: list(
+            Reservation.objects.filter(pk__gt=0, confirmed=False).select_related('customer').order_by('pk')[:50]
+        ))
+
+
+class MenuApiPaginationTests(TestCase):
+    """
+    Cursor pagination over every ordering the menu API offers, including
+    the nullable price columns.
+    """
+
+    def setUp(self):
+        prices = [[90], [150, 250], [], ['50', '100'], [90], [], [320]]
+        MenuItem.objects.bulk_create([
+            MenuItem(
+                name=f'Item {index}', category='soups',
+                sizes_and_prices=[{'size': f'Size {n}', 'price': price} for n, price in enumerate(item_prices)],
+            )
+            for index, item_prices in enumerate(prices)
+        ])
+
+    def walk(self, query):
+        """
+        Follow the next links from the first page, returning every item.
+        """
+        items = []
+        url = f"{reverse('menu-list')}?{query}&page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            items += response.json()['results']
+            url = response.json()['next']
+        return items
+
+    def test_every_ordering_pages_through_every_item_once(self):
+        item_ids = set(MenuItem.objects.values_list('id', flat=True))
+        for ordering in ('id', '-id', 'name', '-category', 'min_price', '-min_price', 'max_price', '-max_price'):
+            with self.subTest(ordering=ordering):
+                ids = [item['id'] for item in self.walk(f'ordering={ordering}')]
+                self.assertEqual(len(ids), len(item_ids))
+                self.assertEqual(set(ids), item_ids)
+
+    def test_unpriced_items_sort_last_both_ways(self):
+        for ordering, column in (('min_price', 'min_price'), ('-max_price', 'max_price')):
+            with self.subTest(ordering=ordering):
+                prices = [item[column] for item in self.walk(f'ordering={ordering}')]
+                self.assertEqual(prices[-2:], [None, None])
+                priced = [float(price) for price in prices[:-2]]
+                self.assertEqual(priced, sorted(priced, reverse=ordering.startswith('-')))
+
+    def test_previous_link_returns_the_earlier_page(self):
+        url = f"{reverse('menu-list')}?ordering=min_price&page_size=3"
+        first = self.client.get(url).json()
+        second = self.client.get(first['next']).json()
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual(
+            [item['id'] for item in previous['results']], [item['id'] for item in first['results']]
+        )
+
+    def test_sparse_fields_keep_the_ordering_column_loaded(self):
+        # One query for the page; the cursor does not load `name` row by row
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{reverse('menu-list')}?ordering=name&fields=id,min_price&page_size=5")
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'min_price'})
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_price_filters(self):
+        names = {item['name'] for item in self.walk('min_price=100&max_price=200')}
+        # Ranges that overlap 100-200: 150-250 and 50-100
+        self.assertEqual(names, {'Item 1', 'Item 3'})
+        response = self.client.get(f"{reverse('menu-list')}?min_price=cheap")
+        self.assertEqual(response.status_code, 400)
+
+
+class ReservationSlotLedgerTests(TestCase):
+    """
+    The slot ledger follows reservations as they are created, edited and
+    deleted, and reconcile_slots rebuilds it from them.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(name='Guest', email='guest@example.com')
+        self.date = timezone.localdate() + datetime.timedelta(days=7)
+
+    def book(self, time, guests):
+        return Reservation.objects.create(customer=self.customer, date=self.date, time=time, guests=guests)
+
+    def booked(self, time):
+        return ReservationSlot.objects.get(date=self.date, time=time).booked_guests
+
+    def test_ledger_follows_reservation_changes(self):
+        reservation = self.book(datetime.time(19, 0), 4)
+        self.book(datetime.time(19, 0), 2)
+        self.assertEqual(self.booked(datetime.time(19, 0)), 6)
+
+        reservation.guests = 3
+        reservation.save()
+        self.assertEqual(self.booked(datetime.time(19, 0)), 5)
+
+        # Moving the party frees its seats in the old slot
+        reservation.time = datetime.time(20, 0)
+        reservation.save()
+        self.assertEqual(self.booked(datetime.time(19, 0)), 2)
+        self.assertEqual(self.booked(datetime.time(20, 0)), 3)
+
+        reservation.delete()
+        self.assertEqual(self.booked(datetime.time(20, 0)), 0)
+
+    def test_reconcile_rebuilds_the_ledger(self):
+        self.book(datetime.time(19, 0), 4)
+        self.book(datetime.time(20, 0), 2)
+        ReservationSlot.objects.filter(time=datetime.time(19, 0)).update(booked_guests=40)
+        ReservationSlot.objects.filter(time=datetime.time(20, 0)).delete()
+        ReservationSlot.objects.create(date=self.date, time=datetime.time(21, 0), booked_guests=7)
+
+        self.assertEqual(reconcile_slots(dry_run=True), {'created': 1, 'corrected': 2, 'unchanged': 0})
+        self.assertEqual(self.booked(datetime.time(19, 0)), 40)
+
+        self.assertEqual(reconcile_slots(), {'created': 1, 'corrected': 2, 'unchanged': 0})
+        self.assertEqual(self.booked(datetime.time(19, 0)), 4)
+        self.assertEqual(self.booked(datetime.time(20, 0)), 2)
+        self.assertEqual(self.booked(datetime.time(21, 0)), 0)
+
+
+def seats_in_use(date):
+    """
+    Peak seats in use on `date`, counted minute by minute from Reservation.
+    """
+    seating = get_default_rule().seating_minutes
+    starts = [
+        (start.hour * 60 + start.minute, guests)
+        for start, guests in Reservation.objects.filter(date=date).values_list('time', 'guests')
+    ]
+    return max(
+        sum(guests for begin, guests in starts if begin <= minute < begin + seating)
+        for minute in range(24 * 60)
+    )
+
+
+@override_settings(NOTIFICATION_DISPATCH_THREADS=0)
+class ConcurrentAdmissionTests(TransactionTestCase):
+    """
+    Concurrent bookings at overlapping start times never overbook the
+    default service (no CapacityRule rows). Needs committed data and one
+    connection per thread, hence TransactionTestCase on the file-backed
+    test database.
+    """
+    BOOKINGS = 400
+    THREADS = 32
+
+    def setUp(self):
+        cache.clear()
+        self.date = timezone.localdate() + datetime.timedelta(days=7)
+        self.times = [datetime.time(19, 0), datetime.time(19, 30), datetime.time(20, 15), datetime.time(21, 0)]
+
+    def test_capacity_is_never_exceeded(self):
+        customers = Customer.objects.bulk_create([
+            Customer(name=f'Guest {i}', email=f'guest{i}@example.com', email_normalized=f'guest{i}@example.com')
+            for i in range(self.BOOKINGS)
+        ])
+        start = threading.Barrier(self.THREADS)
+        outcomes, errors = [], []
+
+        def worker(batch):
+            start.wait()
+            try:
+                for i, customer in batch:
+                    reservation = Reservation(
+                        customer=customer, date=self.date, time=self.times[i % len(self.times)], guests=i % 6 + 1,
+                    )
+                    try:
+                        admit_reservation(reservation)
+                        outcomes.append('admitted')
+                    except SlotFull:
+                        outcomes.append('rejected')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        numbered = list(enumerate(customers))
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            list(executor.map(worker, [numbered[i::self.THREADS] for i in range(self.THREADS)]))
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(outcomes), self.BOOKINGS)
+        self.assertIn('rejected', outcomes)
+        self.assertLessEqual(seats_in_use(self.date), get_default_rule().capacity)
+        # The ledger agrees with the reservations it counts
+        booked = dict(
+            Reservation.objects.filter(date=self.date).values('time').annotate(total=Sum('guests'))
+            .values_list('time', 'total')
+        )
+        ledger = dict(
+            ReservationSlot.objects.filter(date=self.date, booked_guests__gt=0).values_list('time', 'booked_guests')
+        )
+        self.assertEqual(ledger, booked)
+
+
+@override_settings(NOTIFICATION_DISPATCH_THREADS=0)
+class ReservationApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.date = timezone.localdate() + datetime.timedelta(days=7)
+
+    def book(self, guests, email='guest@example.com', time='19:05'):
+        body = {
+            'customer': {'name': 'Guest', 'email': email, 'phone': '+919876543210'},
+            'date': self.date.isoformat(), 'time': time, 'guests': guests,
+        }
+        return self.client.post('/api/reservations/', json.dumps(body), content_type='application/json')
+
+    def test_booking_is_admitted_on_the_slot_grid(self):
+        response = self.book(4)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['time'], '19:00:00')
+        slot = ReservationSlot.objects.get(date=self.date, time=datetime.time(19, 0))
+        self.assertEqual(slot.booked_guests, 4)
+
+    def test_returning_customer_books_again(self):
+        self.assertEqual(self.book(2).status_code, 201)
+        self.assertEqual(self.book(2, email='GUEST@example.com').status_code, 201)
+        self.assertEqual(Customer.objects.count(), 1)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_full_slot_is_refused(self):
+        capacity = get_default_rule().capacity
+        self.assertEqual(self.book(capacity - 2).status_code, 201)
+        response = self.book(4, email='late@example.com', time='19:30')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Only 2 seats remaining', response.json()['non_field_errors'])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_party_must_have_a_guest(self):
+        response = self.book(0)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('guests', response.json())
+
+    def test_past_dates_are_refused(self):
+        self.date = timezone.localdate() - datetime.timedelta(days=1)
+        self.assertEqual(self.book(2).status_code, 400)
+
+
+class CapacityTests(TestCase):
+    """
+    Seats are counted over overlapping seatings, per service.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.upsert(email='guest@example.com', name='Guest', phone='')
+        self.date = timezone.localdate() + datetime.timedelta(days=7)
+        CapacityRule.objects.create(
+            name='Lunch', start_time=datetime.time(12, 0), end_time=datetime.time(15, 0), capacity=20, seating_minutes=60,
+        )
+        CapacityRule.objects.create(
+            name='Dinner', start_time=datetime.time(19, 0), end_time=datetime.time(22, 0), capacity=40, seating_minutes=90,
+        )
+
+    def book(self, time, guests, date=None):
+        # In its own transaction, like the views, so SlotFull rolls it back;
+        # the availability cache is refreshed on commit
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            return admit_reservation(Reservation(customer=self.customer, date=date or self.date, time=time, guests=guests))
+
+    def test_overlapping_seatings_share_the_seats(self):
+        self.book(datetime.time(19, 0), 30)
+        self.assertEqual(get_remaining_capacity(self.date, datetime.time(19, 45)), 10)
+        # The 19:00 party has left by 20:30
+        self.assertEqual(get_remaining_capacity(self.date, datetime.time(20, 30)), 40)
+        # Before the first dinner seating
+        self.assertEqual(get_remaining_capacity(self.date, datetime.time(18, 45)), 0)
+
+        with self.assertRaises(SlotFull) as full:
+            self.book(datetime.time(19, 45), 12)
+        self.assertEqual(full.exception.remaining_capacity, 10)
+        self.book(datetime.time(20, 30), 40)
+
+    def test_services_have_their_own_seats(self):
+        self.book(datetime.time(19, 0), 40)
+        self.assertEqual(get_remaining_capacity(self.date, datetime.time(13, 0)), 20)
+        with self.assertRaises(SlotFull):
+            self.book(datetime.time(13, 0), 21)
+
+    def test_date_rule_replaces_the_every_day_rules(self):
+        CapacityRule.objects.create(
+            name='Holiday', date=self.date, start_time=datetime.time(18, 0), end_time=datetime.time(23, 0), capacity=80,
+        )
+        cache.clear()
+        self.assertEqual(get_remaining_capacity(self.date, datetime.time(19, 0)), 80)
+        self.assertEqual(get_remaining_capacity(self.date, datetime.time(13, 0)), 0)
+        other_day = self.date + datetime.timedelta(days=1)
+        self.assertEqual(get_remaining_capacity(other_day, datetime.time(19, 0)), 40)
+
+    def test_booking_locks_only_overlapping_start_times(self):
+        self.book(datetime.time(13, 0), 4)
+        self.book(datetime.time(19, 0), 6)
+        services = rules_for_date(CapacityRule.objects.all(), self.date)
+        with transaction.atomic():
+            booked = lock_overlapping_slots(self.date, services, datetime.time(20, 0))
+        # 90 minute dinner seatings overlapping 20:00-21:30 start from
+        # 18:31 to 21:29; lunch is left alone
+        overlapping = [datetime.time(hour, minute) for hour in (19, 20, 21) for minute in (0, 15, 30, 45)][:-2]
+        self.assertEqual(sorted(booked), overlapping)
+        self.assertEqual(booked[datetime.time(19, 0)], 6)
+        self.assertNotIn(datetime.time(13, 0), booked)
+        # Every overlapping start has a row to lock
+        self.assertEqual(
+            ReservationSlot.objects.filter(date=self.date, time__in=overlapping).count(), len(overlapping)
+        )
+
+    def test_times_outside_service_hours_are_refused(self):
+        with self.assertRaises(SlotFull) as full:
+            self.book(datetime.time(17, 0), 2)
+        self.assertEqual(full.exception.remaining_capacity, 0)
+        self.assertFalse(Reservation.objects.exists())
+
+
+def failing_send_batch(messages):
+    return [ConnectionRefusedError('SMTP server unavailable')] * len(messages)
+
+
+@override_settings(
+    NOTIFICATION_DISPATCH_THREADS=0, STAFF_DIGEST_MINUTES=0,
+    NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_RETRY_SECONDS=60, NOTIFICATION_RETRY_MAX_SECONDS=3600,
+)
+class NotificationOutboxTests(TestCase):
+    """
+    Queued emails are sent once, retried with backoff and given up on
+    after NOTIFICATION_MAX_ATTEMPTS.
+    """
+
+    def setUp(self):
+        cache.clear()
+        customer = Customer.objects.upsert(email='guest@example.com', name='Guest', phone='')
+        self.reservation = Reservation.objects.create(
+            customer=customer, date=timezone.localdate() + datetime.timedelta(days=7),
+            time=datetime.time(19, 0), guests=2,
+        )
+        queue_reservation_notifications(self.reservation)
+
+    def make_due(self):
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+
+    @contextmanager
+    def failing_server(self):
+        # Every send fails, and each failure is logged
+        with mock.patch('restaurant.outbox.send_batch', failing_send_batch), self.assertLogs('restaurant.outbox', 'WARNING'):
+            yield
+
+    def test_queued_emails_are_sent_once(self):
+        # Queuing again (e.g. a retried request) adds nothing
+        queue_reservation_notifications(self.reservation)
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+
+        self.assertEqual(drain(), {'sent': 2, 'retried': 0, 'dead': 0})
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            {message.extra_headers['X-Idempotency-Key'] for message in mail.outbox},
+            set(NotificationOutbox.objects.values_list('idempotency_key', flat=True)),
+        )
+        self.assertFalse(NotificationOutbox.objects.exclude(status=NotificationOutbox.SENT).exists())
+
+        self.assertEqual(drain(), {'sent': 0, 'retried': 0, 'dead': 0})
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_email_is_retried_with_backoff(self):
+        with self.failing_server():
+            self.assertEqual(drain(), {'sent': 0, 'retried': 2, 'dead': 0})
+            row = NotificationOutbox.objects.first()
+            self.assertEqual(row.status, NotificationOutbox.PENDING)
+            self.assertEqual(row.attempts, 1)
+            self.assertIn('SMTP server unavailable', row.last_error)
+            delay = (row.next_attempt_at - timezone.now()).total_seconds()
+            self.assertTrue(55 < delay <= 60)
+
+            # Not due yet
+            self.assertEqual(drain(), {'sent': 0, 'retried': 0, 'dead': 0})
+
+            self.make_due()
+            drain()
+            row = NotificationOutbox.objects.get(pk=row.pk)
+            self.assertEqual(row.attempts, 2)
+            self.assertTrue(115 < (row.next_attempt_at - timezone.now()).total_seconds() <= 120)
+
+        # The server is back
+        self.make_due()
+        self.assertEqual(drain(), {'sent': 2, 'retried': 0, 'dead': 0})
+        self.assertEqual(NotificationOutbox.objects.get(pk=row.pk).last_error, '')
+
+    def test_email_is_dead_lettered_after_max_attempts(self):
+        with self.failing_server():
+            for _ in range(2):
+                drain()
+                self.make_due()
+            self.assertEqual(drain(), {'sent': 0, 'retried': 0, 'dead': 2})
+        self.assertEqual(set(NotificationOutbox.objects.values_list('status', 'attempts')), {(NotificationOutbox.DEAD, 3)})
+        # Dead rows are not picked up again
+        self.make_due()
+        self.assertEqual(drain(), {'sent': 0, 'retried': 0, 'dead': 0})
+
+    @override_settings(NOTIFICATION_CLAIM_TIMEOUT=600)
+    def test_rows_of_a_crashed_worker_are_claimed_again(self):
+        NotificationOutbox.objects.update(
+            status=NotificationOutbox.SENDING, attempts=1, claimed_at=timezone.now() - datetime.timedelta(minutes=5)
+        )
+        # Still within the claim timeout: the worker may be sending them
+        self.assertEqual(drain(), {'sent': 0, 'retried': 0, 'dead': 0})
+
+        NotificationOutbox.objects.update(claimed_at=timezone.now() - datetime.timedelta(minutes=11))
+        self.assertEqual(drain(), {'sent': 2, 'retried': 0, 'dead': 0})
+        self.assertEqual(set(NotificationOutbox.objects.values_list('attempts', flat=True)), {2})
+
+    def test_email_for_a_deleted_reservation_is_not_sent(self):
+        self.reservation.delete()
+        with self.assertLogs('restaurant.outbox', 'ERROR'):
+            self.assertEqual(drain(), {'sent': 0, 'retried': 0, 'dead': 2})
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@override_settings(STAFF_DIGEST_MINUTES=0)
+class NotificationDispatcherTests(TestCase):
+    """
+    Queued emails go to the in-process dispatcher after commit, which never
+    blocks the caller: a full dispatcher leaves them in the outbox.
+    """
+
+    def test_emails_are_handed_over_on_commit(self):
+        customer = Customer.objects.upsert(email='guest@example.com', name='Guest', phone='')
+        reservation = Reservation.objects.create(
+            customer=customer, date=timezone.localdate() + datetime.timedelta(days=7),
+            time=datetime.time(19, 0), guests=2,
+        )
+        with mock.patch.object(dispatcher, 'submit', return_value=True) as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                send_all_notifications(reservation, customer)
+                # Nothing leaves before the booking commits
+                submit.assert_not_called()
+        (_, keys), = [call.args for call in submit.call_args_list]
+        self.assertEqual(set(keys), set(NotificationOutbox.objects.values_list('idempotency_key', flat=True)))
+        self.assertEqual(len(keys), 2)
+
+    @override_settings(NOTIFICATION_DISPATCH_THREADS=1, NOTIFICATION_DISPATCH_QUEUE=1)
+    def test_full_dispatcher_refuses_work_without_blocking(self):
+        pool = NotificationDispatcher()
+        release = threading.Event()
+        # One running, one waiting, then full
+        self.assertTrue(pool.submit(release.wait))
+        self.assertTrue(pool.submit(release.wait))
+        self.assertFalse(pool.submit(release.wait))
+
+        release.set()
+        pool.shutdown()
+        self.assertFalse(pool.submit(release.wait))
+        # Shutting down again does nothing
+        pool.shutdown()
+
+    @override_settings(NOTIFICATION_DISPATCH_THREADS=0)
+    def test_dispatcher_off(self):
+        self.assertFalse(NotificationDispatcher().submit(print))
+
+
+@override_settings(
+    NOTIFICATION_DISPATCH_THREADS=0, STAFF_DIGEST_MINUTES=30,
+    STAFF_DIGEST_RECIPIENTS=['manager@example.com'], STAFF_DIGEST_MAX_RESERVATIONS=50,
+)
+class StaffDigestTests(TestCase):
+    """
+    Each recipient's watermark moves past every reservation sent to them,
+    so nothing is sent twice or skipped.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.upsert(email='guest@example.com', name='Guest', phone='')
+        self.date = timezone.localdate() + datetime.timedelta(days=7)
+
+    def book(self, count, date=None, **fields):
+        return [
+            Reservation.objects.create(
+                customer=self.customer, date=date or self.date, time=datetime.time(19, 0), guests=2, **fields
+            )
+            for _ in range(count)
+        ]
+
+    def watermark(self):
+        return StaffDigest.objects.get(recipient='manager@example.com').last_reservation_id
+
+    def test_staff_emails_wait_for_the_digest(self):
+        queue_reservation_notifications(self.book(1)[0])
+        self.assertEqual(
+            list(NotificationOutbox.objects.values_list('kind', flat=True)), [NotificationOutbox.CUSTOMER_RESERVATION]
+        )
+
+    def test_digest_starts_after_the_last_individual_staff_email(self):
+        earlier = self.book(1)[0]
+        NotificationOutbox.objects.create(
+            idempotency_key=f'staff_reservation:{earlier.pk}', kind=NotificationOutbox.STAFF_RESERVATION,
+            reservation=earlier, status=NotificationOutbox.SENT,
+        )
+        later = self.book(2)
+
+        self.assertEqual(send_due_digests(), 1)
+        self.assertEqual(mail.outbox[0].subject, '2 New Reservations - Mata Pita Da Dhaba')
+        self.assertEqual(mail.outbox[0].to, ['manager@example.com'])
+        self.assertEqual(self.watermark(), later[-1].pk)
+
+    def test_each_reservation_is_sent_once(self):
+        self.book(2)
+        self.assertEqual(send_due_digests(), 1)
+        # Not due again for STAFF_DIGEST_MINUTES
+        self.book(1)
+        self.assertEqual(send_due_digests(), 0)
+
+        latest = self.book(1)[0]
+        self.assertEqual(send_due_digests(force=True), 1)
+        self.assertEqual(mail.outbox[1].subject, '2 New Reservations - Mata Pita Da Dhaba')
+        self.assertEqual(self.watermark(), latest.pk)
+        # Nothing new
+        self.assertEqual(send_due_digests(force=True), 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    @override_settings(STAFF_DIGEST_MAX_RESERVATIONS=2)
+    def test_backlog_goes_out_in_bounded_digests(self):
+        reservations = self.book(5)
+        self.assertEqual(send_due_digests(), 3)
+        self.assertEqual(
+            [message.subject.split()[0] for message in mail.outbox], ['2', '2', '1']
+        )
+        self.assertEqual(self.watermark(), reservations[-1].pk)
+
+    def test_past_and_confirmed_reservations_are_left_out(self):
+        self.book(1, date=timezone.localdate() - datetime.timedelta(days=1))
+        self.book(1, confirmed=True)
+        latest = self.book(1)[0]
+        self.assertEqual(send_due_digests(), 1)
+        self.assertEqual(mail.outbox[0].subject, '1 New Reservations - Mata Pita Da Dhaba')
+        self.assertEqual(self.watermark(), latest.pk)
+
+    def test_failed_digest_is_retried_on_the_next_run(self):
+        self.book(2)
+        with mock.patch('restaurant.digest.send_batch', failing_send_batch), self.assertLogs('restaurant.digest', 'ERROR'):
+            self.assertEqual(send_due_digests(), 0)
+        self.assertEqual(self.watermark(), 0)
+        # Not held back for a full interval
+        self.assertEqual(send_due_digests(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(STAFF_DIGEST_MINUTES=0)
+    def test_digest_off(self):
+        self.book(1)
+        self.assertEqual(send_due_digests(force=True), 0)
+        self.assertFalse(StaffDigest.objects.exists())
@@ -10,5 +10,9 @@ router.register(r'reservations', views.ReservationViewSet, basename='reservation
 # The API URLs are now determined automatically by the router.
 # This will be included by the main urls.py under the 'api/' prefix.
 urlpatterns = [
+    # Lazily loaded menu page sections (HTML fragments, not JSON)
+    path('menu/category/<slug:category>/', views.menu_category_fragment, name='menu_category_fragment'),
+    # Remaining seats per bookable slot, for the reservation form
+    path('availability/', views.availability_view, name='availability'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
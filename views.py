@@ -1,12 +1,35 @@
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from rest_framework import viewsets
-from .models import MenuItem, Reservation, Customer
+from rest_framework.decorators import action, api_view
+from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+from .models import MenuItem, Reservation, Customer, Waitlist
 from .serializers import MenuItemSerializer, ReservationSerializer
 from .forms import ReservationForm
 from django.db import IntegrityError
-from .notifications import send_all_notifications
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.core.exceptions import ValidationError as DjangoValidationError
+from .outbox import queue_reservation_notifications
+from .capacity import (
+    NoTableAvailable, SlotFull, admit_reservation, booking_transaction, get_remaining_capacity, get_slot_capacity,
+    get_availability_grid, get_slot_minutes, suggest_slots,
+)
+from .menu_search import search_menu_items, DEFAULT_SEARCH_LIMIT
+from .menu_cache import (
+    get_menu_version, get_menu_last_modified, get_menu_page,
+    find_menu_category, get_menu_fragment,
+)
+from django.conf import settings
+from django.http import HttpResponse, Http404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+import datetime
 import logging
+from decimal import Decimal, InvalidOperation
 
 logger = logging.getLogger(__name__)
 
@@ -19,39 +42,94 @@ def index(request):
     return render(request, 'index.html')
 
 
+def _accepts_gzip(request):
+    """
+    Whether Accept-Encoding allows gzip, honoring q-values: "gzip;q=0"
+    refuses it, and "*" covers gzip unless gzip is listed itself.
+    """
+    qualities = {}
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = coding.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def menu_etag(request, *args, **kwargs):
+    """
+    Strong ETag for the menu page, derived from the menu version.
+    The gzipped body is a different representation, so it gets its own tag.
+    """
+    return _menu_etag(request, get_menu_version())
+
+
+def _menu_etag(request, version):
+    encoding = '-gzip' if _accepts_gzip(request) else ''
+    return f'"menu-{version}{encoding}"'
+
+
+def menu_last_modified(request, *args, **kwargs):
+    return datetime.datetime.fromtimestamp(
+        get_menu_last_modified(), tz=datetime.timezone.utc
+    )
+
+
 # --- NEW FUNCTION ---
+# Conditional GETs are answered with a 304 from the cache alone, before the
+# view runs, so revalidation never touches the database or the templates.
+@condition(etag_func=menu_etag, last_modified_func=menu_last_modified)
 def menu_view(request):
     """
     Renders the menu page.
     """
-    # Get all available menu items
-    items = MenuItem.objects.filter(available=True)
-    
-    # Get the unique categories from the items
-    category_names = items.values_list('category', flat=True).distinct()
-    
-    # We will build a list of categories, each containing its items
-    categories = []
-    
-    for category_name in MenuItem.CATEGORY_CHOICES:
-        # category_name is a tuple like ('starter', 'Starter')
-        # We check items that match the internal name (e.g., 'starter')
-        category_items = items.filter(category=category_name[0])
-        
-        # Only add the category to our list if it has items
-        if category_items.exists():
-            categories.append({
-                'name': category_name[1], # The display name (e.g., 'Starter')
-                'items': category_items
-            })
+    # Rendered once per menu version and served from the cache after that
+    version = get_menu_version()
+    page = get_menu_page(request, version)
 
-    context = {
-        'categories': categories
-    }
-    return render(request, 'menu.html', context)
+    if _accepts_gzip(request):
+        response = HttpResponse(page['gzip'])
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(page['body'])
+    # Tag the body with the version it was rendered from; the menu may have
+    # changed since condition() computed its ETag
+    response['ETag'] = _menu_etag(request, version)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    # Let browsers and the CDN keep a copy but always revalidate it
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
 # --- END NEW FUNCTION ---
 
 
+def menu_category_etag(request, category):
+    index, entry = find_menu_category(category)
+    if entry is None:
+        return None
+    return f'"menu-category-{entry["digest"]}-{index}"'
+
+
+@condition(etag_func=menu_category_etag)
+def menu_category_fragment(request, category):
+    """
+    Returns the rendered items of one menu category, for the lazily
+    loaded sections of the menu page.
+    """
+    index, entry = find_menu_category(category)
+    if entry is None:
+        raise Http404("No available items in this category")
+
+    response = HttpResponse(get_menu_fragment(request, index, entry))
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
 def reservation_view(request):
     """
     Handles the reservation form.
@@ -63,69 +141,72 @@ def reservation_view(request):
             customer_name = form.cleaned_data['name']
             customer_email = form.cleaned_data['email']
             customer_phone = form.cleaned_data['phone']
-            
-            # Find or create the customer
-            customer, created = Customer.objects.get_or_create(
-                email=customer_email,
-                defaults={
-                    'name': customer_name,
-                    'phone': customer_phone
-                }
-            )
-            
-            # If customer already exists, just update their name/phone
-            if not created:
-                customer.name = customer_name
-                customer.phone = customer_phone
-                customer.save()
 
             try:
                 # Maximum capacity check
-                MAX_CAPACITY = 45
                 requested_guests = form.cleaned_data['guests']
                 
-                # Check if requested guests exceeds maximum
-                if requested_guests > MAX_CAPACITY:
-                    messages.error(request, f'Maximum {MAX_CAPACITY} guests allowed per reservation.')
-                    return render(request, 'reservation.html', {'form': form})
+                requested_date = form.cleaned_data['date']
+                requested_time = form.cleaned_data['time']
                 
-                # Calculate current capacity for this time slot
-                from django.db.models import Sum
-                existing_reservations = Reservation.objects.filter(
-                    date=form.cleaned_data['date'],
-                    time=form.cleaned_data['time']
-                )
-                total_booked_guests = existing_reservations.aggregate(
-                    total=Sum('guests')
-                )['total'] or 0
+                # Seats of the service (e.g. dinner) this time belongs to
+                slot_capacity = get_slot_capacity(requested_date, requested_time)
                 
-                remaining_capacity = MAX_CAPACITY - total_booked_guests
+                if slot_capacity is None:
+                    messages.error(request, 'We do not take reservations at this time. Please choose a time during opening hours.')
+                    return render(request, 'reservation.html', {'form': form, 'suggestions': suggested_slots(requested_date, requested_time, requested_guests)})
                 
-                # Check if there's enough capacity
-                if requested_guests > remaining_capacity:
-                    if remaining_capacity > 0:
-                        messages.error(request, f'Only {remaining_capacity} seats remaining for this time slot. Please choose another time or reduce the number of guests.')
-                    else:
-                        messages.error(request, 'This time slot is fully booked. Please choose another time.')
-                    return render(request, 'reservation.html', {'form': form})
+                # Check if requested guests exceeds maximum
+                if requested_guests > slot_capacity:
+                    messages.error(request, f'Maximum {slot_capacity} guests allowed per reservation.')
+                    return render(request, 'reservation.html', {'form': form, 'suggestions': suggested_slots(requested_date, requested_time, requested_guests)})
                 
                 # Create the reservation but don't save to DB yet
                 reservation = form.save(commit=False)
-                # Attach the customer to it
-                reservation.customer = customer
-                # Now save the reservation
-                reservation.save()
                 
-                # Send email notifications to staff and customer
+                # Save the customer and the reservation in one transaction, so
+                # a full slot leaves no customer changes behind
                 try:
-                    notification_results = send_all_notifications(reservation, customer)
-                    if notification_results['staff_email']:
-                        logger.info("Staff notification email sent successfully")
-                    if notification_results['customer_email']:
-                        logger.info("Customer confirmation email sent successfully")
-                except Exception as e:
-                    # Log the error but don't break the reservation process
-                    logger.error(f"Failed to send notifications: {str(e)}")
+                    with booking_transaction():
+                        # Find or create the customer (emails match whatever
+                        # the casing) and update their name/phone in one statement
+                        customer = Customer.objects.upsert(
+                            email=customer_email,
+                            name=customer_name,
+                            phone=customer_phone
+                        )
+                        # Attach the customer to it
+                        reservation.customer = customer
+                        # Claim the seats and save in one atomic step, so
+                        # concurrent bookings cannot overbook the slot
+                        admit_reservation(reservation)
+                        # Queue the staff and customer emails with the booking;
+                        # drain_notifications sends them
+                        queue_reservation_notifications(reservation)
+                except SlotFull as full:
+                    if request.POST.get('join_waitlist'):
+                        # The guest asked to wait for this slot rather than pick another
+                        customer = Customer.objects.upsert(
+                            email=customer_email,
+                            name=customer_name,
+                            phone=customer_phone
+                        )
+                        Waitlist.objects.create(
+                            customer=customer, date=reservation.date, time=reservation.time, guests=requested_guests
+                        )
+                        messages.success(request, 'You are on the waitlist! We will email you as soon as a table frees up.')
+                        return redirect('index')
+                    if isinstance(full, NoTableAvailable):
+                        messages.error(request, f'We have no table free for a party of {requested_guests} at this time. Please choose another time.')
+                    elif full.remaining_capacity > 0:
+                        messages.error(request, f'Only {full.remaining_capacity} seats remaining for this time slot. Please choose another time or reduce the number of guests.')
+                    else:
+                        messages.error(request, 'This time slot is fully booked. Please choose another time.')
+                    return render(request, 'reservation.html', {
+                        'form': form,
+                        'suggestions': suggested_slots(requested_date, requested_time, requested_guests),
+                        'offer_waitlist': True,
+                    })
                 
                 # Add a success message
                 messages.success(request, 'Your reservation has been submitted! We will contact you to confirm.')
@@ -150,17 +231,28 @@ def reservation_view(request):
     return render(request, 'reservation.html', context)
 
 
+def suggested_slots(date, time, guests):
+    """
+    Nearest free start times for a party, as JSON-ready dicts.
+    """
+    return [
+        {
+            'date': slot['date'].isoformat(),
+            'time': slot['time'].strftime('%H:%M'),
+            'label': f"{slot['date']:%a %d %b}, {slot['time']:%I:%M %p}",
+            'remaining': slot['remaining'],
+        }
+        for slot in suggest_slots(date, time, guests)
+    ]
+
+
 def check_availability(request):
     """
     API endpoint to check if tables are available for a given date, time, and number of guests.
     Returns JSON response with availability status.
-    Maximum capacity: 45 guests per time slot.
+    Capacity and seating length come from the CapacityRule for the service.
     """
     from django.http import JsonResponse
-    from django.db.models import Sum
-    
-    # Maximum restaurant capacity per time slot
-    MAX_CAPACITY = 45
     
     if request.method == 'GET':
         date = request.GET.get('date')
@@ -178,36 +270,43 @@ def check_availability(request):
         except (ValueError, TypeError):
             requested_guests = 1
         
-        # Validate guest count
-        if requested_guests > MAX_CAPACITY:
+        # Seats free for the whole seating, from one sweep over the day's bookings
+        try:
+            slot_capacity = get_slot_capacity(date, time)
+            remaining_capacity = get_remaining_capacity(date, time)
+        except DjangoValidationError:
             return JsonResponse({
-                'available': False,
-                'message': f'❌ Maximum {MAX_CAPACITY} guests allowed per reservation.'
+                'available': None,
+                'message': 'Please select a valid date and time'
             })
         
-        # Calculate total guests already booked for this date/time
-        existing_reservations = Reservation.objects.filter(
-            date=date,
-            time=time
-        )
-        
-        total_booked_guests = existing_reservations.aggregate(
-            total=Sum('guests')
-        )['total'] or 0
+        if slot_capacity is None:
+            return JsonResponse({
+                'available': False,
+                'message': '❌ We do not take reservations at this time. Please choose a time during opening hours.',
+                'suggestions': suggested_slots(date, time, requested_guests)
+            })
         
-        # Calculate remaining capacity
-        remaining_capacity = MAX_CAPACITY - total_booked_guests
+        # Validate guest count
+        if requested_guests > slot_capacity:
+            return JsonResponse({
+                'available': False,
+                'message': f'❌ Maximum {slot_capacity} guests allowed per reservation.',
+                'suggestions': suggested_slots(date, time, requested_guests)
+            })
         
         if requested_guests > remaining_capacity:
             if remaining_capacity > 0:
                 return JsonResponse({
                     'available': False,
-                    'message': f'❌ Only {remaining_capacity} seats remaining for this time slot. Please choose another time or reduce guests.'
+                    'message': f'❌ Only {remaining_capacity} seats remaining for this time slot. Please choose another time or reduce guests.',
+                    'suggestions': suggested_slots(date, time, requested_guests)
                 })
             else:
                 return JsonResponse({
                     'available': False,
-                    'message': '❌ This time slot is fully booked. Please choose another time.'
+                    'message': '❌ This time slot is fully booked. Please choose another time.',
+                    'suggestions': suggested_slots(date, time, requested_guests)
                 })
         else:
             return JsonResponse({
@@ -222,12 +321,136 @@ def check_availability(request):
 # --- API Views ---
 # (You already have these)
 
+class MenuItemCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the menu API. Cursors stay stable while items are
+    added, and each page is one indexed range query however deep it is.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    # Primary key order is unique, so no item is skipped or repeated
+    ordering = ('id',)
+
+
+class MenuItemOrderingFilter(OrderingFilter):
+    """
+    ?ordering= for the menu API, in a form cursor pagination can page
+    through: the cursor position is the value of the first ordering field,
+    so it must never be NULL, and id is added last to make the order unique.
+    The nullable price columns sort on annotations that put unpriced items
+    last in either direction.
+    """
+    # Annotation that each price column sorts on
+    PRICE_SORT_FIELDS = {'min_price': 'price_from', 'max_price': 'price_to'}
+    # Stand-ins for a missing price: the largest price the columns hold when
+    # sorting up, and one below any price when sorting down
+    UNPRICED_ASCENDING = Decimal('99999.99')
+    UNPRICED_DESCENDING = Decimal('-1')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = []
+        for field in super().get_ordering(request, queryset, view) or ['id']:
+            name = field.lstrip('-')
+            ordering.append(field.replace(name, self.PRICE_SORT_FIELDS.get(name, name)))
+        if ordering[-1].lstrip('-') != 'id':
+            ordering.append('id')
+        return ordering
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        annotations = {}
+        for column, sort_field in self.PRICE_SORT_FIELDS.items():
+            for field in ordering:
+                if field.lstrip('-') == sort_field:
+                    unpriced = self.UNPRICED_DESCENDING if field.startswith('-') else self.UNPRICED_ASCENDING
+                    annotations[sort_field] = Coalesce(column, Value(unpriced))
+        return queryset.annotate(**annotations).order_by(*ordering)
+
+
 class MenuItemViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows menu items to be viewed or edited.
+
+    Filters: ?category= ?sub_category= ?available=true|false ?min_price= ?max_price=
+    Sparse fields: ?fields=id,name,min_price
     """
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
+    pagination_class = MenuItemCursorPagination
+    # ?ordering=min_price / ?ordering=-max_price sorts in the database
+    filter_backends = [MenuItemOrderingFilter]
+    ordering_fields = ['id', 'name', 'category', 'min_price', 'max_price']
+
+    def get_requested_fields(self):
+        """
+        Field names from ?fields=, or None to return every field.
+        Only applies to reads; writes always use the full serializer.
+        """
+        fields = self.request.query_params.get('fields')
+        if self.request.method != 'GET' or not fields:
+            return None
+        return [field.strip() for field in fields.split(',') if field.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        # Exact-match filters, all backed by indexes
+        if params.get('category'):
+            queryset = queryset.filter(category=params['category'])
+        if params.get('sub_category'):
+            queryset = queryset.filter(sub_category=params['sub_category'])
+        available = params.get('available', '').lower()
+        if available in ('true', '1'):
+            queryset = queryset.filter(available=True)
+        elif available in ('false', '0'):
+            queryset = queryset.filter(available=False)
+
+        # ?min_price=&max_price= filter on the indexed price columns
+        min_price = self._parse_price('min_price')
+        max_price = self._parse_price('max_price')
+        if min_price is not None:
+            queryset = queryset.filter(max_price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(min_price__lte=max_price)
+
+        # Only load the columns a sparse fieldset needs
+        requested_fields = self.get_requested_fields()
+        if requested_fields:
+            concrete_fields = {field.name for field in MenuItem._meta.concrete_fields}
+            # The cursor is read from the ordering column, so keep it loaded
+            ordering = self.request.query_params.get(MenuItemOrderingFilter.ordering_param, '')
+            ordering_fields = {field.strip().lstrip('-') for field in ordering.split(',')}
+            queryset = queryset.only('id', *(concrete_fields & (set(requested_fields) | ordering_fields)))
+        return queryset
+
+    def _parse_price(self, param):
+        value = self.request.query_params.get(param)
+        if not value:
+            return None
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({param: 'Enter a number.'})
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search: /api/menu/search/?q=paneer%20tik
+        """
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_SEARCH_LIMIT))
+        except (ValueError, TypeError):
+            limit = DEFAULT_SEARCH_LIMIT
+        items = search_menu_items(query, limit=limit)
+        serializer = self.get_serializer(items, many=True)
+        return Response({'query': query, 'count': len(items), 'results': serializer.data})
 
 
 class ReservationViewSet(viewsets.ModelViewSet):
@@ -235,4 +458,42 @@ class ReservationViewSet(viewsets.ModelViewSet):
     API endpoint that allows reservations to be viewed or edited.
     """
     queryset = Reservation.objects.all()
-    serializer_class = ReservationSerializer
\ No newline at end of file
+    serializer_class = ReservationSerializer
+
+
+@api_view(['GET'])
+def availability_view(request):
+    """
+    Remaining seats for every bookable slot over a range of days:
+    /api/availability/?date=2025-11-25&days=7
+
+    The reservation form loads this once and checks guest counts locally,
+    instead of asking the server on every change.
+    """
+    try:
+        start_date = datetime.date.fromisoformat(request.query_params.get('date', ''))
+    except ValueError:
+        raise ValidationError({'date': 'Enter a date as YYYY-MM-DD.'})
+
+    max_days = getattr(settings, 'RESERVATION_GRID_MAX_DAYS', 14)
+    try:
+        days = int(request.query_params.get('days', 1))
+    except (ValueError, TypeError):
+        raise ValidationError({'days': 'Enter a whole number.'})
+    if not 1 <= days <= max_days:
+        raise ValidationError({'days': f'Enter a number between 1 and {max_days}.'})
+
+    grid, max_guests = get_availability_grid(start_date, days)
+    response = Response({
+        'date': start_date.isoformat(),
+        'days': days,
+        'max_guests': max_guests,
+        'slot_minutes': get_slot_minutes(),
+        'slots': {
+            date.isoformat(): {time.strftime('%H:%M'): remaining for time, remaining in day_slots.items()}
+            for date, day_slots in grid.items()
+        },
+    })
+    # Short-lived: the form re-checks on submit, so slightly stale counts are fine
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'RESERVATION_AVAILABILITY_MAX_AGE', 30))
+    return response
@@ -0,0 +1,116 @@
+"""
+Waitlist promotion.
+When seats free up, waiting parties become reservations, first come first
+served among the parties that fit. Each slot is promoted in one transaction
+with bulk writes, and queues the promotion emails in the notification
+outbox, so nothing is sent while the slot is locked.
+"""
+
+import logging
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CapacityRule, NotificationOutbox, Reservation, ReservationSlot, Waitlist
+from .capacity import (
+    booking_transaction, load_table_plan, lock_overlapping_slots, remaining_for_times, rules_for_date, seating_window,
+    service_for,
+)
+from .availability_cache import bump_availability
+from .outbox import queue_notifications
+
+logger = logging.getLogger(__name__)
+
+
+def promote_slot(date, time):
+    """
+    Turn waiting parties for one slot into reservations while seats and
+    tables last, oldest entry first. A party that does not fit is skipped
+    and keeps its place for the next run.
+
+    Returns:
+        int: Number of parties promoted
+    """
+    with booking_transaction():
+        waiting = list(
+            Waitlist.objects.select_for_update()
+            .filter(status=Waitlist.WAITING, date=date, time=time)
+            .order_by('created_at')
+        )
+        services = rules_for_date(CapacityRule.objects.all(), date)
+        service = service_for(services, time)
+        if not waiting or service is None:
+            return 0
+
+        booked = lock_overlapping_slots(date, services, time)
+        remaining = remaining_for_times(booked, services, [time])[time]
+        plan = load_table_plan(date, services)
+        window = seating_window(services, time)
+
+        admitted = []
+        for entry in waiting:
+            if entry.guests > remaining:
+                continue
+            table_ids = ()
+            if plan is not None:
+                table_ids = plan.find(entry.guests, *window)
+                if table_ids is None:
+                    continue
+                plan.book(table_ids, *window)
+            remaining -= entry.guests
+            admitted.append((entry, table_ids))
+        if not admitted:
+            return 0
+
+        # bulk_create skips the Reservation signals, so the ledger and the
+        # availability cache are updated here, once for the whole batch
+        reservations = Reservation.objects.bulk_create([
+            Reservation(customer_id=entry.customer_id, date=date, time=time, guests=entry.guests)
+            for entry, _ in admitted
+        ])
+        ReservationSlot.objects.filter(date=date, time=time).update(
+            booked_guests=F('booked_guests') + sum(entry.guests for entry, _ in admitted)
+        )
+        Reservation.tables.through.objects.bulk_create([
+            Reservation.tables.through(reservation_id=reservation.pk, table_id=table_id)
+            for reservation, (_, table_ids) in zip(reservations, admitted)
+            for table_id in table_ids
+        ])
+
+        now = timezone.now()
+        for reservation, (entry, _) in zip(reservations, admitted):
+            entry.status = Waitlist.PROMOTED
+            entry.promoted_at = now
+            entry.reservation = reservation
+        Waitlist.objects.bulk_update([entry for entry, _ in admitted], ['status', 'promoted_at', 'reservation'])
+        queue_notifications(NotificationOutbox.WAITLIST_PROMOTION, reservations)
+        transaction.on_commit(partial(bump_availability, date))
+
+    logger.info(f"Promoted {len(admitted)} waitlisted parties to {date} {time}")
+    return len(admitted)
+
+
+def promote_waitlist(date=None):
+    """
+    Promote waiting parties on `date`, or on every day from today on.
+    Without a date, entries for days that have passed are cancelled.
+
+    Returns:
+        dict: {'promoted': count, 'expired': count}
+    """
+    today = timezone.localdate()
+    expired = 0
+    waiting = Waitlist.objects.filter(status=Waitlist.WAITING)
+    if date is None:
+        expired = waiting.filter(date__lt=today).update(status=Waitlist.CANCELLED)
+        waiting = waiting.filter(date__gte=today)
+    else:
+        waiting = waiting.filter(date=date)
+
+    promoted = 0
+    for slot_date, slot_time in waiting.order_by('date', 'time').values_list('date', 'time').distinct():
+        promoted += promote_slot(slot_date, slot_time)
+    return {'promoted': promoted, 'expired': expired}
+